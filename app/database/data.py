@@ -1,18 +1,128 @@
 import os
+import httpx
 from dotenv import load_dotenv
-from supabase import create_client
+from postgrest import AsyncPostgrestClient
 
 
 dotenv_path = os.path.join(os.path.dirname(__file__), '..', '.env')
 load_dotenv(dotenv_path)
 
 
+DATA_BACKEND = os.getenv("DATA_BACKEND", "supabase")
+
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
+POOL_MAX_CONNECTIONS = int(os.getenv("SUPABASE_POOL_MAX_CONNECTIONS", "100"))
+POOL_MAX_KEEPALIVE = int(os.getenv("SUPABASE_POOL_MAX_KEEPALIVE", "20"))
+
+MEMORY_SEED_PATH = os.getenv("MEMORY_SEED_PATH")
+
+
+class PooledPostgrestClient(AsyncPostgrestClient):
+    """ async PostgREST client that shares one pooled HTTP/2 session per worker """
+
+    def create_session(self, base_url, headers, timeout, verify=True, proxy=None):
+        return httpx.AsyncClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=timeout,
+            verify=verify,
+            proxy=proxy,
+            follow_redirects=True,
+            http2=True,
+            limits=httpx.Limits(
+                max_connections=POOL_MAX_CONNECTIONS,
+                max_keepalive_connections=POOL_MAX_KEEPALIVE
+            )
+        )
+
+
+def create_supabase_client():
+    """ build the PostgREST client of the Supabase project """
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        raise ValueError("Faltan las credenciales de Supabase. Revisa tu archivo .env")
+
+    return PooledPostgrestClient(
+        f"{SUPABASE_URL}/rest/v1",
+        headers={
+            "apiKey": SUPABASE_KEY,
+            "Authorization": f"Bearer {SUPABASE_KEY}"
+        }
+    )
+
+
+def create_memory_client():
+    """ build the in-memory datastore, seeded from MEMORY_SEED_PATH when it is set """
+    from app.database.memory import MemoryDatastore
+
+    datastore = MemoryDatastore()
+
+    if MEMORY_SEED_PATH:
+        datastore.load(MEMORY_SEED_PATH)
+
+    return datastore
+
+
+BACKENDS = {
+    "supabase": create_supabase_client,
+    "memory": create_memory_client,
+}
+
+
+def create_datastore(backend: str = DATA_BACKEND):
+    """ build the datastore client selected by DATA_BACKEND """
+    if backend not in BACKENDS:
+        raise ValueError(f"DATA_BACKEND desconocido: {backend}. Usa uno de {', '.join(BACKENDS)}")
+
+    return BACKENDS[backend]()
+
+
+def instrument(datastore):
+    """ time and count the queries of the datastore when metrics are enabled """
+    from app.services.metrics import METRICS_ENABLED
+    from app.database.instrumented import InstrumentedDatastore
+
+    return InstrumentedDatastore(datastore) if METRICS_ENABLED else datastore
+
+
+class LazyDatastore:
+    """ stands in for the datastore client until it is opened
+
+    Importing the app builds no client: the lifespan of app/main.py opens it
+    before serving, and scripts that use the datastore without the app get it
+    built on first use.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._client = None
+
+
+    def open(self):
+        if self._client is None:
+            self._client = self._factory()
+        return self._client
+
+
+    async def aclose(self):
+        client, self._client = self._client, None
+        if client is not None:
+            await client.aclose()
+
+
+    def __getattr__(self, name):
+        return getattr(self.open(), name)
+
+
+supabase = LazyDatastore(lambda: instrument(create_datastore()))
+
 
-if not SUPABASE_URL or not SUPABASE_KEY:
-    raise ValueError("Faltan las credenciales de Supabase. Revisa tu archivo .env")
+def open_client():
+    """ build the datastore client, failing at startup instead of on the first request """
+    supabase.open()
 
 
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
\ No newline at end of file
+async def close_client():
+    """ close the pooled connections of the datastore client """
+    await supabase.aclose()
@@ -0,0 +1,69 @@
+import time
+
+from app.services.metrics import record_query
+
+
+OPERATIONS = ("select", "insert", "upsert", "update", "delete")
+
+
+class InstrumentedQuery:
+    """ wraps a query builder so its execute() is timed and counted """
+
+    def __init__(self, query, target: str, operation: str = "select"):
+        self._query = query
+        self._target = target
+        self._operation = operation
+
+
+    def __getattr__(self, name):
+        attribute = getattr(self._query, name)
+
+        if not callable(attribute):
+            return InstrumentedQuery(attribute, self._target, self._operation) if hasattr(attribute, "execute") else attribute
+
+        def call(*args, **kwargs):
+            result = attribute(*args, **kwargs)
+            if hasattr(result, "execute"):
+                operation = name if name in OPERATIONS and self._operation == "select" else self._operation
+                return InstrumentedQuery(result, self._target, operation)
+            return result
+
+        return call
+
+
+    async def execute(self):
+        started = time.perf_counter()
+        try:
+            response = await self._query.execute()
+        except Exception:
+            record_query(self._target, self._operation, time.perf_counter() - started, 0, failed=True)
+            raise
+
+        data = getattr(response, "data", None)
+        rows = len(data) if isinstance(data, list) else int(data is not None)
+        record_query(self._target, self._operation, time.perf_counter() - started, rows)
+
+        return response
+
+
+class InstrumentedDatastore:
+    """ datastore client whose queries report to app/services/metrics.py """
+
+    def __init__(self, datastore):
+        self._datastore = datastore
+
+
+    def table(self, name: str) -> InstrumentedQuery:
+        return InstrumentedQuery(self._datastore.table(name), name)
+
+
+    def from_(self, name: str) -> InstrumentedQuery:
+        return self.table(name)
+
+
+    def rpc(self, name: str, params: dict, **kwargs) -> InstrumentedQuery:
+        return InstrumentedQuery(self._datastore.rpc(name, params, **kwargs), f"rpc:{name}", "rpc")
+
+
+    def __getattr__(self, name):
+        return getattr(self._datastore, name)
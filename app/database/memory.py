@@ -0,0 +1,928 @@
+import json
+import re
+from collections import defaultdict
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional
+
+from postgrest.exceptions import APIError
+
+
+TABLES = ("users", "clients", "tasks", "time_entries", "time_entry_rollup", "revoked_tokens")
+
+# many-to-one relations used by the embedded selects, (table, embedded table) -> foreign key column
+RELATIONS = {
+    ("tasks", "clients"): "client_id",
+    ("tasks", "users"): "assigned_to_id",
+    ("time_entries", "tasks"): "task_id",
+    ("time_entries", "users"): "user_id",
+    ("time_entry_rollup", "clients"): "client_id",
+}
+
+# columns with an equality index, besides the primary key
+INDEXES = {
+    "users": ("username",),
+    "tasks": ("client_id", "assigned_to_id"),
+    "time_entries": ("task_id", "user_id"),
+    "time_entry_rollup": ("task_id", "client_id"),
+}
+
+TIMESTAMP_COLUMNS = {"start_time", "end_time", "due_date", "assignment_date", "expires_at"}
+
+
+def canonical_timestamp(value):
+    """ normalize a timestamp to the naive ISO 8601 text PostgREST returns for timestamp columns """
+    if value is None:
+        return None
+
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+
+    return value.isoformat()
+
+
+class MemoryResponse:
+    """ result of an execute(), shaped like the postgrest APIResponse """
+
+    def __init__(self, data: list, count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+
+class MemoryTable:
+    """ rows of one table with an auto increment id and equality indexes """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.rows: Dict[int, dict] = {}
+        self.next_id = 1
+        self.indexes = {column: defaultdict(set) for column in INDEXES.get(name, ())}
+
+
+    def _index(self, row: dict):
+        for column, index in self.indexes.items():
+            index[row.get(column)].add(row["id"])
+
+
+    def _unindex(self, row: dict):
+        for column, index in self.indexes.items():
+            ids = index.get(row.get(column))
+            if ids is not None:
+                ids.discard(row["id"])
+                if not ids:
+                    del index[row.get(column)]
+
+
+    def insert(self, values: dict) -> dict:
+        row = {column: normalize(column, value) for column, value in values.items()}
+
+        if row.get("id") is None:
+            row["id"] = self.next_id
+        self.next_id = max(self.next_id, row["id"] + 1)
+
+        if row["id"] in self.rows:
+            raise APIError({"message": f"duplicate key value violates unique constraint \"{self.name}_pkey\"", "code": "23505"})
+
+        apply_defaults(self.name, row)
+        self.rows[row["id"]] = row
+        self._index(row)
+        return row
+
+
+    def update(self, row: dict, values: dict) -> dict:
+        self._unindex(row)
+        row.update({column: normalize(column, value) for column, value in values.items()})
+        apply_defaults(self.name, row, updated=values)
+        self._index(row)
+        return row
+
+
+    def delete(self, row: dict) -> dict:
+        self._unindex(row)
+        return self.rows.pop(row["id"])
+
+
+    def candidates(self, filters: list) -> List[dict]:
+        """ narrow the scan with the primary key or an indexed equality filter """
+        for column, operator, value in filters:
+            if operator != "eq" or "." in column:
+                continue
+
+            if column == "id":
+                row = self.rows.get(coerce_id(value))
+                return [row] if row else []
+
+            if column in self.indexes:
+                ids = self.indexes[column].get(coerce_key(column, value), ())
+                return [self.rows[id] for id in sorted(ids)]
+
+        return list(self.rows.values())
+
+
+def normalize(column: str, value):
+    if column in TIMESTAMP_COLUMNS and value is not None:
+        return canonical_timestamp(value)
+    return value
+
+
+def coerce_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def coerce_key(column: str, value):
+    return coerce_id(value) if column.endswith("id") else value
+
+
+def apply_defaults(table: str, row: dict, updated: Optional[dict] = None):
+    """ column defaults and computed values the Supabase schema provides """
+    if table == "time_entries" and row.get("start_time") and row.get("end_time"):
+        times_changed = updated is not None and ("start_time" in updated or "end_time" in updated)
+        if (updated is None and row.get("duration") is None) or (times_changed and "duration" not in updated):
+            start_time = datetime.fromisoformat(row["start_time"])
+            end_time = datetime.fromisoformat(row["end_time"])
+            row["duration"] = (end_time - start_time).total_seconds() / 3600
+
+    elif table == "tasks" and updated is None:
+        row.setdefault("status", "pendiente")
+        row.setdefault("assignment_date", canonical_timestamp(datetime.now(timezone.utc)))
+        row.setdefault("description", None)
+        row.setdefault("total_time", 0)
+
+
+def split_top_level(text: str) -> List[str]:
+    """ split on commas that are not nested inside parentheses or quotes """
+    parts, depth, quoted, current = [], 0, False, []
+
+    for char in text:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == "(":
+            depth += 1
+        elif not quoted and char == ")":
+            depth -= 1
+        elif not quoted and char == "," and depth == 0:
+            parts.append("".join(current).strip())
+            current = []
+            continue
+        current.append(char)
+
+    if "".join(current).strip():
+        parts.append("".join(current).strip())
+
+    return parts
+
+
+EMBED_PATTERN = re.compile(r"^(\w+)(!inner)?\((.*)\)$", re.S)
+
+
+def parse_select(columns: str) -> list:
+    """ parse a PostgREST select into columns and embedded resources """
+    items = []
+
+    for item in split_top_level(columns):
+        match = EMBED_PATTERN.match(item)
+        if match:
+            items.append(("embed", match.group(1), bool(match.group(2)), parse_select(match.group(3))))
+        else:
+            items.append(("column", item, False, None))
+
+    return items
+
+
+def parse_value(operator: str, raw: str):
+    raw = raw.strip()
+
+    if operator == "in":
+        return [parse_value("eq", value) for value in split_top_level(raw.strip("()"))]
+
+    if raw.startswith('"') and raw.endswith('"'):
+        return raw[1:-1]
+
+    if operator == "is":
+        return {"null": None, "true": True, "false": False}.get(raw.lower(), raw)
+
+    return raw
+
+
+def parse_logic(expression: str) -> tuple:
+    """ parse the body of an or/and filter into a predicate tree """
+    expression = expression.strip()
+
+    for logic in ("or", "and"):
+        if expression.startswith(logic + "(") and expression.endswith(")"):
+            return (logic, [parse_logic(part) for part in split_top_level(expression[len(logic) + 1:-1])])
+
+    column, operator, raw = expression.split(".", 2)
+    negate = operator == "not"
+    if negate:
+        operator, raw = raw.split(".", 1)
+
+    return ("filter", (column, operator, parse_value(operator, raw), negate))
+
+
+def lookup(row: dict, column: str):
+    value = row
+    for part in column.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+@lru_cache(maxsize=1024)
+def filter_timestamp(value: str):
+    try:
+        return canonical_timestamp(value)
+    except ValueError:
+        return value
+
+
+def filter_value(column: str, value):
+    """ bring a filter operand to the representation the rows are stored with """
+    if column.split(".")[-1] in TIMESTAMP_COLUMNS and isinstance(value, (str, datetime)):
+        return filter_timestamp(value if isinstance(value, str) else value.isoformat())
+    if isinstance(value, str):
+        try:
+            return float(value) if "." in value else int(value)
+        except ValueError:
+            return value
+    return value
+
+
+def compare(row: dict, column: str, operator: str, value) -> bool:
+    current = lookup(row, column)
+
+    if operator == "is":
+        return current is value
+
+    if operator == "in":
+        return current in [filter_value(column, item) for item in value]
+
+    if operator in ("like", "ilike"):
+        if current is None:
+            return False
+        pattern = "^" + re.escape(str(value)).replace("%", ".*").replace("\\*", ".*").replace("_", ".") + "$"
+        return re.match(pattern, str(current), re.I if operator == "ilike" else 0) is not None
+
+    if current is None:
+        return False
+
+    right = filter_value(column, value)
+
+    if type(current) is not type(right) and not (isinstance(current, (int, float)) and isinstance(right, (int, float))):
+        current, right = str(current), str(right)
+
+    return {
+        "eq": current == right,
+        "neq": current != right,
+        "gt": current > right,
+        "gte": current >= right,
+        "lt": current < right,
+        "lte": current <= right,
+    }[operator]
+
+
+def evaluate(row: dict, node: tuple) -> bool:
+    kind, body = node
+
+    if kind == "or":
+        return any(evaluate(row, child) for child in body)
+
+    if kind == "and":
+        return all(evaluate(row, child) for child in body)
+
+    column, operator, value, negate = body
+    return compare(row, column, operator, value) != negate
+
+
+class MemoryQuery:
+    """ fluent query builder mirroring the subset of postgrest-py the models use """
+
+    def __init__(self, store: "MemoryDatastore", table: Optional[str], source: Optional[List[dict]] = None):
+        self.store = store
+        self.table = table
+        self.source = source
+        self.operation = "select"
+        self.columns = "*"
+        self.count_method = None
+        self.payload = None
+        self.upsert_conflict = None
+        self.ignore_duplicates = False
+        self.filters = []
+        self.logic = []
+        self.ordering = []
+        self.limit_count = None
+        self.offset_count = 0
+
+
+    def select(self, *columns, count: Optional[str] = None, **kwargs):
+        self.columns = ",".join(columns) if columns else "*"
+        self.count_method = count
+        return self
+
+
+    def insert(self, data, **kwargs):
+        self.operation = "insert"
+        self.payload = data
+        return self
+
+
+    def upsert(self, data, on_conflict: str = "", ignore_duplicates: bool = False, **kwargs):
+        self.operation = "upsert"
+        self.payload = data
+        self.upsert_conflict = [column.strip() for column in on_conflict.split(",") if column.strip()] or ["id"]
+        self.ignore_duplicates = ignore_duplicates
+        return self
+
+
+    def update(self, data, **kwargs):
+        self.operation = "update"
+        self.payload = data
+        return self
+
+
+    def delete(self, **kwargs):
+        self.operation = "delete"
+        return self
+
+
+    def filter(self, column: str, operator: str, value):
+        negate = operator.startswith("not.")
+        operator = operator[4:] if negate else operator
+        self.logic.append(("filter", (column, operator, parse_value(operator, str(value)), negate)))
+        return self
+
+
+    def _add(self, column: str, operator: str, value):
+        self.filters.append((column, operator, value))
+        self.logic.append(("filter", (column, operator, value, False)))
+        return self
+
+
+    def eq(self, column, value):
+        return self._add(column, "eq", value)
+
+    def neq(self, column, value):
+        return self._add(column, "neq", value)
+
+    def gt(self, column, value):
+        return self._add(column, "gt", value)
+
+    def gte(self, column, value):
+        return self._add(column, "gte", value)
+
+    def lt(self, column, value):
+        return self._add(column, "lt", value)
+
+    def lte(self, column, value):
+        return self._add(column, "lte", value)
+
+    def like(self, column, pattern):
+        return self._add(column, "like", pattern)
+
+    def ilike(self, column, pattern):
+        return self._add(column, "ilike", pattern)
+
+    def is_(self, column, value):
+        return self._add(column, "is", value)
+
+    def in_(self, column, values):
+        return self._add(column, "in", list(values))
+
+    def match(self, query: dict):
+        for column, value in query.items():
+            self.eq(column, value)
+        return self
+
+
+    def or_(self, filters: str, reference_table: Optional[str] = None):
+        node = parse_logic(f"or({filters})")
+        if reference_table:
+            node = prefix_columns(node, reference_table)
+        self.logic.append(node)
+        return self
+
+
+    def order(self, column: str, *, desc: bool = False, nullsfirst: bool = False, foreign_table: Optional[str] = None):
+        self.ordering.append((column, desc, nullsfirst))
+        return self
+
+
+    def limit(self, size: int, *, foreign_table: Optional[str] = None):
+        self.limit_count = size
+        return self
+
+
+    def range(self, start: int, end: int, foreign_table: Optional[str] = None):
+        self.offset_count = start
+        self.limit_count = end - start + 1
+        return self
+
+
+    async def execute(self) -> MemoryResponse:
+        return self.store.run(self)
+
+
+def prefix_columns(node: tuple, table: str) -> tuple:
+    kind, body = node
+    if kind == "filter":
+        column, operator, value, negate = body
+        return ("filter", (f"{table}.{column}", operator, value, negate))
+    return (kind, [prefix_columns(child, table) for child in body])
+
+
+class MemoryDatastore:
+    """ in-process stand-in for the Supabase datastore with the same tables and join semantics """
+
+    def __init__(self):
+        self.tables: Dict[str, MemoryTable] = {}
+        self.functions: Dict[str, Callable[["MemoryDatastore", dict], List[dict]]] = dict(RPC_FUNCTIONS)
+
+        for name in TABLES:
+            self.tables[name] = MemoryTable(name)
+
+
+    def get_table(self, name: str) -> MemoryTable:
+        if name not in self.tables:
+            self.tables[name] = MemoryTable(name)
+        return self.tables[name]
+
+
+    def table(self, name: str) -> MemoryQuery:
+        return MemoryQuery(self, name)
+
+
+    def from_(self, name: str) -> MemoryQuery:
+        return self.table(name)
+
+
+    def rpc(self, name: str, params: dict, **kwargs) -> MemoryQuery:
+        function = self.functions.get(name)
+        if function is None:
+            raise APIError({"message": f"Could not find the function public.{name}", "code": "PGRST202"})
+        return MemoryQuery(self, None, source=function(self, params or {}))
+
+
+    def seed(self, data: Dict[str, List[dict]]):
+        """ load rows per table, keeping their ids """
+        for name, rows in data.items():
+            table = self.get_table(name)
+            for row in rows:
+                table.insert(row)
+
+
+    def load(self, path: str):
+        """ seed the datastore from a JSON file with a list of rows per table """
+        with open(path, encoding="utf-8") as file:
+            self.seed(json.load(file))
+
+
+    async def aclose(self):
+        pass
+
+
+    def embed(self, table: str, row: dict, items: list) -> Optional[dict]:
+        """ project a row through a parsed select, resolving embedded resources """
+        result = {}
+
+        for kind, name, inner, children in items:
+            if kind == "column":
+                if name == "*":
+                    result.update(row)
+                elif name in row:
+                    result[name] = row[name]
+                continue
+
+            foreign_key = RELATIONS.get((table, name))
+            if foreign_key is None:
+                raise APIError({"message": f"Could not find a relationship between '{table}' and '{name}'", "code": "PGRST200"})
+
+            target = self.get_table(name).rows.get(row.get(foreign_key))
+            result[name] = self.embed(name, target, children) if target else None
+
+            if inner and result[name] is None:
+                return None
+
+        return result
+
+
+    def select_rows(self, query: MemoryQuery) -> List[dict]:
+        items = parse_select(query.columns)
+
+        if query.source is not None:
+            return [
+                row if query.columns == "*" else self.embed(None, row, items)
+                for row in query.source
+                if all(evaluate(row, node) for node in query.logic)
+            ]
+
+        table = self.get_table(query.table)
+        rows = []
+
+        for row in table.candidates(query.filters):
+            projected = self.embed(query.table, row, items)
+            if projected is not None and all(evaluate(inner_view(row, projected), node) for node in query.logic):
+                rows.append(projected)
+
+        return rows
+
+
+    def matching(self, query: MemoryQuery) -> List[dict]:
+        table = self.get_table(query.table)
+        return [
+            row for row in table.candidates(query.filters)
+            if all(evaluate(row, node) for node in query.logic)
+        ]
+
+
+    def run(self, query: MemoryQuery) -> MemoryResponse:
+        operation = query.operation
+
+        if operation == "select":
+            rows = self.select_rows(query)
+            count = len(rows) if query.count_method else None
+            rows = sort_rows(rows, query.ordering)
+            if query.offset_count:
+                rows = rows[query.offset_count:]
+            if query.limit_count is not None:
+                rows = rows[:query.limit_count]
+            return MemoryResponse(copy_rows(rows), count)
+
+        table = self.get_table(query.table)
+
+        if operation == "insert":
+            payload = query.payload if isinstance(query.payload, list) else [query.payload]
+            if query.table == "time_entries":
+                check_no_overlap(table, payload)
+            return MemoryResponse(copy_rows([table.insert(values) for values in payload]))
+
+        if operation == "upsert":
+            payload = query.payload if isinstance(query.payload, list) else [query.payload]
+            rows = []
+            for values in payload:
+                existing = [
+                    row for row in table.rows.values()
+                    if all(row.get(column) == normalize(column, values.get(column)) for column in query.upsert_conflict)
+                ]
+                if not existing:
+                    rows.append(table.insert(values))
+                elif not query.ignore_duplicates:
+                    # on conflict do nothing returns only the rows inserted
+                    rows.append(table.update(existing[0], values))
+            return MemoryResponse(copy_rows(rows))
+
+        if operation == "update":
+            matching = self.matching(query)
+            # the seeded histories may overlap, only writes that move an interval are checked
+            if query.table == "time_entries" and {"start_time", "end_time", "user_id"} & set(query.payload):
+                check_no_overlap(table, [dict(row, **query.payload) for row in matching])
+            rows = [table.update(row, query.payload) for row in matching]
+            return MemoryResponse(copy_rows(rows))
+
+        if operation == "delete":
+            rows = [table.delete(row) for row in self.matching(query)]
+            return MemoryResponse(copy_rows(rows))
+
+        raise APIError({"message": f"Unsupported operation {operation}", "code": "PGRST000"})
+
+
+def inner_view(row: dict, projected: dict) -> dict:
+    """ filters may reference base columns that the select did not project """
+    view = dict(row)
+    view.update(projected)
+    return view
+
+
+def sort_rows(rows: List[dict], ordering: list) -> List[dict]:
+    for column, desc, nullsfirst in reversed(ordering):
+        present = [row for row in rows if lookup(row, column) is not None]
+        missing = [row for row in rows if lookup(row, column) is None]
+        present.sort(key=lambda row: lookup(row, column), reverse=desc)
+        # postgres puts nulls last on ascending and first on descending order
+        nulls_first = nullsfirst or desc
+        rows = missing + present if nulls_first else present + missing
+    return rows
+
+
+def copy_rows(rows: List[dict]) -> List[dict]:
+    return [{key: dict(value) if isinstance(value, dict) else value for key, value in row.items()} for row in rows]
+
+
+def rpc_hours_by_client(store: MemoryDatastore, params: dict) -> List[dict]:
+    """ memory version of app/database/sql/hours_by_client.sql """
+    start = canonical_timestamp(params["p_start"])
+    end = canonical_timestamp(params["p_end"])
+    client_id = params.get("p_client_id")
+
+    tasks = store.get_table("tasks").rows
+    clients = store.get_table("clients").rows
+    totals = {}
+
+    for entry in store.get_table("time_entries").rows.values():
+        task = tasks.get(entry.get("task_id"))
+        if task is None or entry["start_time"] < start or entry["end_time"] > end:
+            continue
+        if client_id is not None and task["client_id"] != client_id:
+            continue
+        key = (task["client_id"], task["title"])
+        totals[key] = totals.get(key, 0) + (entry.get("duration") or 0)
+
+    active = {client for client, title in totals}
+    titles = sorted({(task["client_id"], task["title"]) for task in tasks.values() if task["client_id"] in active})
+
+    return [
+        {
+            "client_id": client,
+            "client_name": clients[client]["name"] if client in clients else None,
+            "task_title": title,
+            "hours": float(totals.get((client, title), 0))
+        }
+        for client, title in titles
+    ]
+
+
+def rpc_delete_client_cascade(store: MemoryDatastore, params: dict) -> List[dict]:
+    """ memory version of delete_client_cascade in app/database/sql/cascade_delete.sql """
+    client_id = params["p_client_id"]
+    tasks = store.get_table("tasks")
+    entries = store.get_table("time_entries")
+
+    task_rows = tasks.candidates([("client_id", "eq", client_id)])
+    deleted_entries = 0
+
+    rollup = store.get_table("time_entry_rollup")
+    for row in rollup.candidates([("client_id", "eq", client_id)]):
+        rollup.delete(row)
+
+    for task in task_rows:
+        for entry in entries.candidates([("task_id", "eq", task["id"])]):
+            entries.delete(entry)
+            deleted_entries += 1
+        tasks.delete(task)
+
+    clients = store.get_table("clients")
+    client = clients.rows.get(client_id)
+    if client:
+        clients.delete(client)
+
+    return [{"time_entries": deleted_entries, "tasks": len(task_rows), "clients": 1 if client else 0}]
+
+
+def rpc_delete_task_cascade(store: MemoryDatastore, params: dict) -> List[dict]:
+    """ memory version of delete_task_cascade in app/database/sql/cascade_delete.sql """
+    task_id = params["p_task_id"]
+    tasks = store.get_table("tasks")
+    entries = store.get_table("time_entries")
+
+    rollup = store.get_table("time_entry_rollup")
+    for row in rollup.candidates([("task_id", "eq", task_id)]):
+        rollup.delete(row)
+
+    deleted_entries = 0
+    for entry in entries.candidates([("task_id", "eq", task_id)]):
+        entries.delete(entry)
+        deleted_entries += 1
+
+    task = tasks.rows.get(task_id)
+    if task:
+        tasks.delete(task)
+
+    return [{"time_entries": deleted_entries, "tasks": 1 if task else 0}]
+
+
+def rpc_tasks_with_totals(store: MemoryDatastore, params: dict) -> List[dict]:
+    """ memory version of app/database/sql/tasks_with_totals.sql """
+    start = canonical_timestamp(params.get("p_start"))
+    end = canonical_timestamp(params.get("p_end"))
+    due_from = canonical_timestamp(params.get("p_due_from"))
+    due_to = canonical_timestamp(params.get("p_due_to"))
+    after_id = params.get("p_after_id")
+    limit = params.get("p_limit")
+
+    tasks = store.get_table("tasks")
+    clients = store.get_table("clients").rows
+    users = store.get_table("users").rows
+    entries = store.get_table("time_entries")
+
+    filters = [
+        (column, "eq", params[name])
+        for column, name in (("client_id", "p_client_id"), ("assigned_to_id", "p_assigned_to_id"))
+        if params.get(name) is not None
+    ]
+    page = []
+
+    for task in sorted(tasks.candidates(filters), key=lambda task: task["id"]):
+        if any(task.get(column) != value for column, _, value in filters):
+            continue
+        if after_id is not None and task["id"] <= after_id:
+            continue
+        if due_from is not None and (task.get("due_date") is None or task["due_date"] < due_from):
+            continue
+        if due_to is not None and (task.get("due_date") is None or task["due_date"] > due_to):
+            continue
+        page.append(task)
+        if limit is not None and len(page) == limit:
+            break
+
+    rows = []
+    for task in page:
+        total = 0.0
+        for entry in entries.candidates([("task_id", "eq", task["id"])]):
+            if start is not None and entry["start_time"] < start:
+                continue
+            if end is not None and entry["end_time"] > end:
+                continue
+            total += entry.get("duration") or 0
+
+        client = clients.get(task.get("client_id"))
+        user = users.get(task.get("assigned_to_id"))
+        rows.append({
+            "id": task["id"],
+            "client_id": task.get("client_id"),
+            "client_name": client["name"] if client else None,
+            "title": task.get("title"),
+            "description": task.get("description"),
+            "status": task.get("status"),
+            "assigned_to_id": task.get("assigned_to_id"),
+            "assigned_to": user["username"] if user else None,
+            "assignment_date": task.get("assignment_date"),
+            "due_date": task.get("due_date"),
+            "total_time": total
+        })
+
+    return rows
+
+
+def first_overlap(table: MemoryTable, user_id, start_time, end_time, exclude_ids=()) -> Optional[dict]:
+    """ the first entry of the user whose [start_time, end_time) overlaps the interval """
+    start_time, end_time = canonical_timestamp(start_time), canonical_timestamp(end_time)
+    overlapping = [
+        row for row in table.candidates([("user_id", "eq", user_id)])
+        if row["id"] not in exclude_ids and row["start_time"] < end_time and start_time < row["end_time"]
+    ]
+    return min(overlapping, key=lambda row: row["start_time"], default=None)
+
+
+def check_no_overlap(table: MemoryTable, rows: List[dict]):
+    """ memory version of the time_entries_no_overlap exclusion constraint in app/database/sql/time_entry_overlap.sql """
+    written = [row for row in rows if row.get("start_time") and row.get("end_time")]
+    replaced = {row["id"] for row in written if row.get("id") is not None}
+
+    for index, row in enumerate(written):
+        conflict = first_overlap(table, row.get("user_id"), row["start_time"], row["end_time"], replaced)
+        batch = any(
+            other.get("user_id") == row.get("user_id")
+            and canonical_timestamp(other["start_time"]) < canonical_timestamp(row["end_time"])
+            and canonical_timestamp(row["start_time"]) < canonical_timestamp(other["end_time"])
+            for other in written[:index]
+        )
+        if conflict or batch:
+            raise APIError({
+                "message": 'conflicting key value violates exclusion constraint "time_entries_no_overlap"',
+                "code": "23P01"
+            })
+
+
+def rpc_time_entry_overlaps(store: MemoryDatastore, params: dict) -> List[dict]:
+    """ memory version of time_entry_overlaps in app/database/sql/time_entry_overlap.sql """
+    table = store.get_table("time_entries")
+    exclude_ids = {params["p_exclude_id"]} if params.get("p_exclude_id") is not None else set()
+    rows = []
+
+    for index, interval in enumerate(params["p_intervals"]):
+        conflict = first_overlap(table, params["p_user_id"], interval["start_time"], interval["end_time"], exclude_ids)
+        if conflict:
+            rows.append({
+                "idx": index,
+                "id": conflict["id"],
+                "task_id": conflict.get("task_id"),
+                "start_time": conflict["start_time"],
+                "end_time": conflict["end_time"]
+            })
+
+    return rows
+
+
+def rpc_update_time_entry_times(store: MemoryDatastore, params: dict) -> List[dict]:
+    """ memory version of app/database/sql/update_time_entry.sql """
+    table = store.get_table("time_entries")
+    row = table.rows.get(params["p_entry_id"])
+    if row is None:
+        return []
+
+    start_time = canonical_timestamp(params.get("p_start_time")) or row["start_time"]
+    end_time = canonical_timestamp(params.get("p_end_time")) or row["end_time"]
+    if start_time >= end_time:
+        raise APIError({"message": "start_time must be before end_time", "code": "23514"})
+
+    duration = (datetime.fromisoformat(end_time) - datetime.fromisoformat(start_time)).total_seconds() / 3600
+    values = {"start_time": start_time, "end_time": end_time, "duration": duration}
+    check_no_overlap(table, [dict(row, **values)])
+
+    old_entry = dict(row)
+    new_entry = dict(table.update(row, values))
+    return [{"old_entry": old_entry, "new_entry": new_entry}]
+
+
+def rollup_key(store: MemoryDatastore, task_id, user_id, start_time) -> Optional[tuple]:
+    task = store.get_table("tasks").rows.get(task_id)
+    if task is None:
+        return None
+    return (canonical_timestamp(start_time)[:10], user_id, task["client_id"], task_id)
+
+
+def expected_rollup(store: MemoryDatastore) -> Dict[tuple, list]:
+    """ hours and entries per rollup key, summed from the time entries """
+    totals = {}
+    for entry in store.get_table("time_entries").rows.values():
+        key = rollup_key(store, entry.get("task_id"), entry.get("user_id"), entry["start_time"])
+        if key is not None:
+            total = totals.setdefault(key, [0.0, 0])
+            total[0] += entry.get("duration") or 0
+            total[1] += 1
+    return totals
+
+
+def rollup_rows(store: MemoryDatastore) -> Dict[tuple, dict]:
+    return {
+        (row["day"], row["user_id"], row["client_id"], row["task_id"]): row
+        for row in store.get_table("time_entry_rollup").rows.values()
+    }
+
+
+def rpc_apply_time_entry_rollup(store: MemoryDatastore, params: dict) -> List[dict]:
+    """ memory version of apply_time_entry_rollup in app/database/sql/time_entry_rollup.sql """
+    table = store.get_table("time_entry_rollup")
+    changes = {}
+
+    for change in params["p_changes"]:
+        key = rollup_key(store, change["task_id"], change["user_id"], change["start_time"])
+        if key is not None:
+            total = changes.setdefault(key, [0.0, 0])
+            total[0] += change["hours"]
+            total[1] += change["entries"]
+
+    for (day, user_id, client_id, task_id), (hours, entries) in changes.items():
+        existing = [
+            row for row in table.candidates([("task_id", "eq", task_id)])
+            if row["day"] == day and row["user_id"] == user_id and row["client_id"] == client_id
+        ]
+        if existing:
+            row = table.update(existing[0], {"hours": existing[0]["hours"] + hours, "entries": existing[0]["entries"] + entries})
+        else:
+            row = table.insert({"day": day, "user_id": user_id, "client_id": client_id, "task_id": task_id, "hours": hours, "entries": entries})
+        if row["entries"] <= 0:
+            table.delete(row)
+
+    return []
+
+
+def rpc_rebuild_time_entry_rollup(store: MemoryDatastore, params: dict) -> List[dict]:
+    """ memory version of rebuild_time_entry_rollup in app/database/sql/time_entry_rollup.sql """
+    store.tables["time_entry_rollup"] = table = MemoryTable("time_entry_rollup")
+
+    for (day, user_id, client_id, task_id), (hours, entries) in expected_rollup(store).items():
+        table.insert({"day": day, "user_id": user_id, "client_id": client_id, "task_id": task_id, "hours": hours, "entries": entries})
+
+    return [{"rollup_rows": len(table.rows)}]
+
+
+def rpc_time_entry_rollup_drift(store: MemoryDatastore, params: dict) -> List[dict]:
+    """ memory version of time_entry_rollup_drift in app/database/sql/time_entry_rollup.sql """
+    tolerance = params.get("p_tolerance", 1e-6)
+    expected = expected_rollup(store)
+    stored = rollup_rows(store)
+    drift = []
+
+    for key in sorted(set(expected) | set(stored)):
+        hours, entries = expected.get(key, (None, None))
+        row = stored.get(key)
+        if hours is not None and row is not None and abs(hours - row["hours"]) <= tolerance and entries == row["entries"]:
+            continue
+        day, user_id, client_id, task_id = key
+        drift.append({
+            "day": day, "user_id": user_id, "client_id": client_id, "task_id": task_id,
+            "expected_hours": hours, "rollup_hours": row["hours"] if row else None,
+            "expected_entries": entries, "rollup_entries": row["entries"] if row else None
+        })
+
+    return drift
+
+
+RPC_FUNCTIONS: Dict[str, Callable[[MemoryDatastore, dict], List[dict]]] = {
+    "hours_by_client": rpc_hours_by_client,
+    "delete_client_cascade": rpc_delete_client_cascade,
+    "delete_task_cascade": rpc_delete_task_cascade,
+    "tasks_with_totals": rpc_tasks_with_totals,
+    "time_entry_overlaps": rpc_time_entry_overlaps,
+    "update_time_entry_times": rpc_update_time_entry_times,
+    "apply_time_entry_rollup": rpc_apply_time_entry_rollup,
+    "rebuild_time_entry_rollup": rpc_rebuild_time_entry_rollup,
+    "time_entry_rollup_drift": rpc_time_entry_rollup_drift,
+}
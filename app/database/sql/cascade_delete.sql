@@ -0,0 +1,49 @@
+-- Set-based cascade deletes for clients and tasks.
+--
+-- Each function removes the time entries, the tasks and (for clients) the
+-- client in one transaction with one statement per table, children first,
+-- and returns how many rows it deleted from each table.
+
+create or replace function delete_client_cascade(p_client_id bigint)
+returns table (time_entries bigint, tasks bigint, clients bigint)
+language plpgsql
+as $$
+declare
+    deleted_entries bigint;
+    deleted_tasks bigint;
+    deleted_clients bigint;
+begin
+    delete from time_entries te
+    using tasks t
+    where t.id = te.task_id
+      and t.client_id = p_client_id;
+    get diagnostics deleted_entries = row_count;
+
+    delete from tasks t where t.client_id = p_client_id;
+    get diagnostics deleted_tasks = row_count;
+
+    delete from clients c where c.id = p_client_id;
+    get diagnostics deleted_clients = row_count;
+
+    return query select deleted_entries, deleted_tasks, deleted_clients;
+end;
+$$;
+
+
+create or replace function delete_task_cascade(p_task_id bigint)
+returns table (time_entries bigint, tasks bigint)
+language plpgsql
+as $$
+declare
+    deleted_entries bigint;
+    deleted_tasks bigint;
+begin
+    delete from time_entries te where te.task_id = p_task_id;
+    get diagnostics deleted_entries = row_count;
+
+    delete from tasks t where t.id = p_task_id;
+    get diagnostics deleted_tasks = row_count;
+
+    return query select deleted_entries, deleted_tasks;
+end;
+$$;
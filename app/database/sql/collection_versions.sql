@@ -0,0 +1,42 @@
+-- Version counters of the collections behind the polled listings.
+--
+-- Every statement that writes clients, tasks or time_entries bumps the
+-- version of its table. The API keeps the versions in memory to build the
+-- ETags of /tasks/get_task, /tasks/get_tasks_by_user and
+-- /clients/get_clients_admin, bumps them itself on its own writes and
+-- reloads this table every COLLECTION_VERSIONS_REFRESH_SECONDS, so writes
+-- made by other workers or directly in the database change the ETags too.
+
+create table if not exists collection_versions (
+    name text primary key,
+    version bigint not null default 0
+);
+
+insert into collection_versions (name)
+values ('clients'), ('tasks'), ('time_entries')
+on conflict (name) do nothing;
+
+create or replace function bump_collection_version()
+returns trigger
+language plpgsql
+as $$
+begin
+    update collection_versions set version = version + 1 where name = tg_table_name;
+    return null;
+end;
+$$;
+
+drop trigger if exists clients_bump_version on clients;
+create trigger clients_bump_version
+    after insert or update or delete on clients
+    for each statement execute function bump_collection_version();
+
+drop trigger if exists tasks_bump_version on tasks;
+create trigger tasks_bump_version
+    after insert or update or delete on tasks
+    for each statement execute function bump_collection_version();
+
+drop trigger if exists time_entries_bump_version on time_entries;
+create trigger time_entries_bump_version
+    after insert or update or delete on time_entries
+    for each statement execute function bump_collection_version();
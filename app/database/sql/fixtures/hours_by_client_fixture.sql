@@ -0,0 +1,94 @@
+-- Self-checking fixture for hours_by_client.sql.
+--
+-- Runs against any local Postgres in a throwaway schema and raises when the
+-- aggregated output differs from what the previous Python aggregation of
+-- /reports/hours_by_client/ returned for the same rows:
+--
+--     psql -v ON_ERROR_STOP=1 -f app/database/sql/fixtures/hours_by_client_fixture.sql
+
+drop schema if exists hours_by_client_fixture cascade;
+create schema hours_by_client_fixture;
+set search_path to hours_by_client_fixture;
+
+create table clients (
+    id bigint primary key,
+    name text not null,
+    color text
+);
+
+create table tasks (
+    id bigint primary key,
+    client_id bigint references clients (id),
+    title text not null
+);
+
+create table time_entries (
+    id bigserial primary key,
+    task_id bigint references tasks (id),
+    user_id bigint,
+    start_time timestamp not null,
+    end_time timestamp not null,
+    duration double precision
+);
+
+insert into clients (id, name, color) values
+    (1, 'Acme', '#ff0000'),
+    (2, 'Globex', '#00ff00'),
+    (3, 'Initech', '#0000ff');
+
+insert into tasks (id, client_id, title) values
+    (10, 1, 'Audit'),
+    (11, 1, 'Tax'),
+    (12, 1, 'Audit'),
+    (13, 1, 'Payroll'),
+    (20, 2, 'Advisory'),
+    (30, 3, 'Idle');
+
+insert into time_entries (task_id, user_id, start_time, end_time, duration) values
+    (10, 1, '2025-01-02 09:00:00', '2025-01-02 11:00:00', 2.0),
+    (12, 1, '2025-01-03 09:00:00', '2025-01-03 10:30:00', 1.5),
+    (11, 2, '2025-01-03 13:00:00', '2025-01-03 13:45:00', 0.75),
+    (20, 2, '2025-01-05 08:00:00', '2025-01-05 12:20:00', 13.0 / 3),
+    -- outside the range: starts before, ends after, or entirely after it
+    (20, 1, '2024-12-31 23:00:00', '2025-01-01 01:00:00', 2.0),
+    (11, 1, '2025-01-31 23:00:00', '2025-02-01 00:30:00', 1.5),
+    (30, 3, '2025-02-01 09:00:00', '2025-02-01 10:00:00', 1.0);
+
+\ir ../hours_by_client.sql
+
+do $$
+declare
+    mismatches integer;
+begin
+    with expected (client_id, client_name, task_title, hours) as (
+        values
+            (1::bigint, 'Acme', 'Audit', 3.5::double precision),
+            (1, 'Acme', 'Payroll', 0),
+            (1, 'Acme', 'Tax', 0.75),
+            (2, 'Globex', 'Advisory', 13.0 / 3)
+    ),
+    actual as (
+        select * from hours_by_client('2025-01-01 00:00:00', '2025-01-31 23:59:59')
+    )
+    select count(*) into mismatches
+    from expected e
+    full join actual a
+        on a.client_id = e.client_id
+       and a.client_name = e.client_name
+       and a.task_title = e.task_title
+       and abs(a.hours - e.hours) < 1e-9
+    where a.client_id is null or e.client_id is null;
+
+    if mismatches > 0 then
+        raise exception 'hours_by_client: % rows differ from the expected report', mismatches;
+    end if;
+
+    if (select count(*) from hours_by_client('2025-01-01', '2025-01-31 23:59:59', 2)) <> 1 then
+        raise exception 'hours_by_client: client filter returned unexpected rows';
+    end if;
+
+    raise notice 'hours_by_client fixture passed';
+end
+$$;
+
+drop schema hours_by_client_fixture cascade;
@@ -0,0 +1,46 @@
+-- Hours per client and per task between two dates, aggregated in the database.
+--
+-- Mirrors the semantics of /reports/hours_by_client/: an entry counts when
+-- start_time >= p_start and end_time <= p_end, hours are summed from the
+-- stored duration and grouped by the task title. Every task of a client
+-- that logged hours in the range is listed, with 0 when it has no entries.
+-- p_client_id restricts the report to a single client.
+
+create or replace function hours_by_client(
+    p_start timestamp,
+    p_end timestamp,
+    p_client_id bigint default null
+)
+returns table (
+    client_id bigint,
+    client_name text,
+    task_title text,
+    hours double precision
+)
+language sql
+stable
+as $$
+    with totals as (
+        select t.client_id, t.title, sum(te.duration) as hours
+        from time_entries te
+        join tasks t on t.id = te.task_id
+        where te.start_time >= p_start
+          and te.end_time <= p_end
+          and (p_client_id is null or t.client_id = p_client_id)
+        group by t.client_id, t.title
+    ),
+    titles as (
+        select distinct t.client_id, t.title
+        from tasks t
+        where t.client_id in (select totals.client_id from totals)
+    )
+    select
+        titles.client_id::bigint,
+        c.name::text,
+        titles.title::text,
+        coalesce(totals.hours, 0)::double precision
+    from titles
+    left join totals on totals.client_id = titles.client_id and totals.title = titles.title
+    left join clients c on c.id = titles.client_id
+    order by titles.client_id, titles.title;
+$$;
@@ -0,0 +1,14 @@
+-- JWT ids revoked before their expiry (logout, refresh token rotation).
+--
+-- Every worker keeps the unexpired ids in memory and reloads them
+-- periodically; rows are useless once expires_at has passed and are
+-- deleted by the same refresh.
+
+create table if not exists revoked_tokens (
+    jti text primary key,
+    user_id bigint references users (id) on delete cascade,
+    expires_at timestamptz not null,
+    revoked_at timestamptz not null default now()
+);
+
+create index if not exists revoked_tokens_expires_at_idx on revoked_tokens (expires_at);
@@ -0,0 +1,76 @@
+-- Tasks with their logged hours, in one query.
+--
+-- Backs get_all_tasks and get_tasks_by_user_id in app/models/ModelTasks.py.
+-- total_time is the sum of the stored duration of the task's time entries,
+-- computed here instead of trusting the tasks.total_time column, which
+-- nothing keeps up to date. p_start and p_end restrict the sum to entries
+-- with start_time >= p_start and end_time <= p_end, the window semantics
+-- of the reports; tasks without entries in the window get 0.
+--
+-- The filters and the keyset page (id > p_after_id, at most p_limit rows)
+-- are applied before the sum, so only the entries of the returned tasks
+-- are read, through the time_entries (task_id) index.
+
+create index if not exists time_entries_task_id_idx on time_entries (task_id);
+
+create or replace function tasks_with_totals(
+    p_start timestamp default null,
+    p_end timestamp default null,
+    p_client_id bigint default null,
+    p_assigned_to_id bigint default null,
+    p_due_from timestamp default null,
+    p_due_to timestamp default null,
+    p_after_id bigint default null,
+    p_limit integer default null
+)
+returns table (
+    id bigint,
+    client_id bigint,
+    client_name text,
+    title text,
+    description text,
+    status text,
+    assigned_to_id bigint,
+    assigned_to text,
+    assignment_date timestamp,
+    due_date timestamp,
+    total_time double precision
+)
+language sql
+stable
+as $$
+    with page as (
+        select t.*
+        from tasks t
+        where (p_client_id is null or t.client_id = p_client_id)
+          and (p_assigned_to_id is null or t.assigned_to_id = p_assigned_to_id)
+          and (p_due_from is null or t.due_date >= p_due_from)
+          and (p_due_to is null or t.due_date <= p_due_to)
+          and (p_after_id is null or t.id > p_after_id)
+        order by t.id
+        limit p_limit
+    )
+    select
+        page.id::bigint,
+        page.client_id::bigint,
+        c.name::text,
+        page.title::text,
+        page.description::text,
+        page.status::text,
+        page.assigned_to_id::bigint,
+        u.username::text,
+        page.assignment_date::timestamp,
+        page.due_date::timestamp,
+        coalesce(totals.hours, 0)::double precision
+    from page
+    left join clients c on c.id = page.client_id
+    left join users u on u.id = page.assigned_to_id
+    left join lateral (
+        select sum(te.duration) as hours
+        from time_entries te
+        where te.task_id = page.id
+          and (p_start is null or te.start_time >= p_start)
+          and (p_end is null or te.end_time <= p_end)
+    ) totals on true
+    order by page.id;
+$$;
@@ -0,0 +1,82 @@
+-- No overlapping time entries per user.
+--
+-- The exclusion constraint keeps the [start_time, end_time) intervals of a
+-- user disjoint, atomically, even when two writes race. Its GiST index on
+-- (user_id, tsrange(start_time, end_time)) answers "does this interval hit
+-- another entry of the user" in O(log n), which time_entry_overlaps uses so
+-- the API can answer 409 with the conflicting entry before writing. Entries
+-- that only touch (one ends when the next starts) do not overlap.
+--
+-- Existing overlaps make the constraint impossible to add. The block below
+-- refuses to run while there are any; list them with:
+--
+--     select a.user_id, a.id, b.id
+--     from time_entries a
+--     join time_entries b on b.user_id = a.user_id and b.id > a.id
+--      and tsrange(a.start_time, a.end_time) && tsrange(b.start_time, b.end_time);
+
+create extension if not exists btree_gist;
+
+do $$
+declare
+    overlapping_pairs bigint;
+begin
+    if exists (select 1 from pg_constraint where conname = 'time_entries_no_overlap') then
+        return;
+    end if;
+
+    select count(*) into overlapping_pairs
+    from time_entries a
+    join time_entries b on b.user_id = a.user_id and b.id > a.id
+     and tsrange(a.start_time, a.end_time) && tsrange(b.start_time, b.end_time);
+
+    if overlapping_pairs > 0 then
+        raise exception 'time_entries has % overlapping pairs, fix them before adding time_entries_no_overlap', overlapping_pairs;
+    end if;
+
+    alter table time_entries
+        add constraint time_entries_no_overlap
+        exclude using gist (user_id with =, tsrange(start_time, end_time) with &&);
+end;
+$$;
+
+
+-- For each interval of p_intervals ([{"start_time": ..., "end_time": ...}]),
+-- the first entry of the user it overlaps, ignoring the entry p_exclude_id
+-- (the one being updated). idx is the position of the interval in the
+-- array; intervals without a conflict return no row.
+
+create or replace function time_entry_overlaps(
+    p_user_id bigint,
+    p_intervals jsonb,
+    p_exclude_id bigint default null
+)
+returns table (
+    idx integer,
+    id bigint,
+    task_id bigint,
+    start_time timestamp,
+    end_time timestamp
+)
+language sql
+stable
+as $$
+    select
+        (interval_.ordinality - 1)::integer,
+        conflict.id::bigint,
+        conflict.task_id::bigint,
+        conflict.start_time::timestamp,
+        conflict.end_time::timestamp
+    from jsonb_array_elements(p_intervals) with ordinality as interval_(value, ordinality)
+    cross join lateral (
+        select te.id, te.task_id, te.start_time, te.end_time
+        from time_entries te
+        where te.user_id = p_user_id
+          and tsrange(te.start_time, te.end_time)
+              && tsrange((interval_.value->>'start_time')::timestamp, (interval_.value->>'end_time')::timestamp)
+          and (p_exclude_id is null or te.id <> p_exclude_id)
+        order by te.start_time
+        limit 1
+    ) conflict
+    order by 1;
+$$;
@@ -0,0 +1,115 @@
+-- Daily rollup of logged hours per (day, user, client, task).
+--
+-- Kept up to date incrementally by apply_time_entry_rollup on every time
+-- entry write; the foreign keys remove the rows of deleted tasks and
+-- clients. rebuild_time_entry_rollup backfills it from time_entries and
+-- time_entry_rollup_drift lists the keys where both disagree.
+
+create table if not exists time_entry_rollup (
+    day date not null,
+    user_id bigint not null,
+    client_id bigint not null references clients (id) on delete cascade,
+    task_id bigint not null references tasks (id) on delete cascade,
+    hours double precision not null default 0,
+    entries integer not null default 0,
+    primary key (day, user_id, client_id, task_id)
+);
+
+create index if not exists time_entry_rollup_client_day_idx on time_entry_rollup (client_id, day);
+create index if not exists time_entry_rollup_task_idx on time_entry_rollup (task_id);
+
+
+-- p_changes: [{"task_id", "user_id", "start_time", "hours", "entries"}, ...]
+-- with negative hours and entries for removed time entries.
+create or replace function apply_time_entry_rollup(p_changes jsonb)
+returns void
+language plpgsql
+as $$
+begin
+    insert into time_entry_rollup as r (day, user_id, client_id, task_id, hours, entries)
+    select c.start_time::date, c.user_id, t.client_id, c.task_id, sum(c.hours), sum(c.entries)
+    from jsonb_to_recordset(p_changes)
+        as c (task_id bigint, user_id bigint, start_time timestamp, hours double precision, entries integer)
+    join tasks t on t.id = c.task_id
+    group by 1, 2, 3, 4
+    on conflict (day, user_id, client_id, task_id)
+    do update set hours = r.hours + excluded.hours, entries = r.entries + excluded.entries;
+
+    delete from time_entry_rollup r
+    using (
+        select distinct c.start_time::date as day, c.user_id, t.client_id, c.task_id
+        from jsonb_to_recordset(p_changes) as c (task_id bigint, user_id bigint, start_time timestamp)
+        join tasks t on t.id = c.task_id
+    ) k
+    where r.entries <= 0
+      and r.day = k.day
+      and r.user_id = k.user_id
+      and r.client_id = k.client_id
+      and r.task_id = k.task_id;
+end;
+$$;
+
+
+create or replace function rebuild_time_entry_rollup()
+returns table (rollup_rows bigint)
+language plpgsql
+as $$
+declare
+    rebuilt bigint;
+begin
+    delete from time_entry_rollup;
+
+    insert into time_entry_rollup (day, user_id, client_id, task_id, hours, entries)
+    select te.start_time::date, te.user_id, t.client_id, te.task_id, coalesce(sum(te.duration), 0), count(*)
+    from time_entries te
+    join tasks t on t.id = te.task_id
+    group by 1, 2, 3, 4;
+
+    get diagnostics rebuilt = row_count;
+    return query select rebuilt;
+end;
+$$;
+
+
+create or replace function time_entry_rollup_drift(p_tolerance double precision default 1e-6)
+returns table (
+    day date,
+    user_id bigint,
+    client_id bigint,
+    task_id bigint,
+    expected_hours double precision,
+    rollup_hours double precision,
+    expected_entries bigint,
+    rollup_entries bigint
+)
+language sql
+stable
+as $$
+    with expected as (
+        select te.start_time::date as day, te.user_id, t.client_id, te.task_id,
+               coalesce(sum(te.duration), 0) as hours, count(*) as entries
+        from time_entries te
+        join tasks t on t.id = te.task_id
+        group by 1, 2, 3, 4
+    )
+    select
+        coalesce(e.day, r.day),
+        coalesce(e.user_id, r.user_id),
+        coalesce(e.client_id, r.client_id),
+        coalesce(e.task_id, r.task_id),
+        e.hours,
+        r.hours,
+        e.entries,
+        r.entries::bigint
+    from expected e
+    full join time_entry_rollup r
+        on r.day = e.day
+       and r.user_id = e.user_id
+       and r.client_id = e.client_id
+       and r.task_id = e.task_id
+    where e.day is null
+       or r.day is null
+       or abs(e.hours - r.hours) > p_tolerance
+       or e.entries <> r.entries
+    order by 1, 2, 3, 4;
+$$;
@@ -0,0 +1,41 @@
+-- Update the times of a time entry and return the row before and after.
+--
+-- The rollup and the report cache are adjusted by the difference between
+-- both rows, so they have to come from the write itself: the row lock
+-- serializes concurrent updates of one entry and each one sees the row
+-- the previous one left. Only the times sent are changed, the duration is
+-- recomputed from the result. Returns no row when the entry does not
+-- exist, and raises check_violation when the start is not before the end.
+
+create or replace function update_time_entry_times(
+    p_entry_id bigint,
+    p_start_time timestamp default null,
+    p_end_time timestamp default null
+)
+returns table (old_entry jsonb, new_entry jsonb)
+language plpgsql
+as $$
+declare
+    old_row time_entries;
+    new_row time_entries;
+begin
+    select * into old_row from time_entries te where te.id = p_entry_id for update;
+
+    if not found then
+        return;
+    end if;
+
+    update time_entries te
+    set start_time = coalesce(p_start_time, te.start_time),
+        end_time = coalesce(p_end_time, te.end_time),
+        duration = extract(epoch from coalesce(p_end_time, te.end_time) - coalesce(p_start_time, te.start_time)) / 3600
+    where te.id = p_entry_id
+    returning te.* into new_row;
+
+    if new_row.start_time >= new_row.end_time then
+        raise exception 'start_time must be before end_time' using errcode = 'check_violation';
+    end if;
+
+    return query select to_jsonb(old_row), to_jsonb(new_row);
+end;
+$$;
@@ -1,8 +1,40 @@
-from fastapi import FastAPI, status
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from app.routes import TimeEntry, auth, clientes, reports, tasks
+from fastapi.responses import PlainTextResponse
+from app.database.data import close_client, open_client
+from app.routes import TimeEntry, auth, clientes, reports, tasks, timers
+from app.services.jobs import report_jobs
+from app.services.metrics import METRICS_ENABLED, METRICS_TOKEN, MetricsMiddleware, render_metrics
+from app.services.pagination import NEXT_CURSOR_HEADER
+from app.services.responses import RESPONSE_COMPRESSION, CompressionMiddleware
+from app.services.revocation import revoked_tokens
+from app.services.timers import running_timers
+from app.services.utils import password_executor
+from app.services.versions import collection_versions
+from app.services.write_behind import time_entry_writer
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """ open the datastore and start the background services, on shutdown save the running timers and queued entries, then release the pooled datastore connections and worker threads """
+    open_client()
+    await report_jobs.start()
+    revoked_tokens.start()
+    running_timers.start()
+    await time_entry_writer.start()
+    collection_versions.start()
+    yield
+    await collection_versions.stop()
+    await running_timers.stop()
+    await time_entry_writer.stop()
+    await revoked_tokens.stop()
+    await report_jobs.stop()
+    await close_client()
+    password_executor.shutdown(wait=False)
+
+
+app = FastAPI(lifespan=lifespan)
 
 
 app.add_middleware(
@@ -11,14 +43,34 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  
     allow_headers=["*"],  
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 
+if RESPONSE_COMPRESSION:
+    app.add_middleware(CompressionMiddleware)
+
+
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+
 app.include_router(auth.router)
 app.include_router(clientes.router)
 app.include_router(tasks.router)
 app.include_router(TimeEntry.router)
 app.include_router(reports.router)
+app.include_router(timers.router)
+
+if METRICS_ENABLED:
+
+    @app.get('/metrics', include_in_schema=False)
+    def metrics(request: Request):
+        """ request and datastore metrics in the Prometheus text format """
+        if METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {METRICS_TOKEN}":
+            raise HTTPException(status_code=401, detail="No autorizado")
+        return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 
 @app.get('/')
 def root():
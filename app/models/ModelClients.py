@@ -1,32 +1,44 @@
+from typing import Optional
 from app.database.data import supabase
-from app.models.ModelTasks import delete_task
+from app.services.pagination import cursor_value, keyset_page
+from app.services.report_cache import report_cache
+from app.services.versions import collection_versions
 
 
 
-def create_client(name: str, color: str):
+async def create_client(name: str, color: str):
     
-    response = supabase.table('clients').insert({
+    response = await supabase.table('clients').insert({
         'name': name,
         'color': color
     }).execute()
 
     if response.data:
+        collection_versions.bump('clients')
         return {"message": "Usuario creado exitosamente", "user": response.data}
     else:
         return {"error": "Error al crear el usuario", "details": response.error}
     
 
 
-def read_clients():
+async def read_clients(limit: int, cursor: Optional[dict] = None, name: Optional[str] = None):
 
-    response = supabase.table('clients').select('*').execute()
+    query = supabase.table('clients').select('*')
 
+    if name is not None:
+        query = query.ilike('name', f'%{name}%')
+
+    if cursor:
+        query = query.gt('id', cursor_value(cursor, 'id', int))
+
+    response = await query.order('id').limit(limit + 1).execute()
 
-    return response.data
 
+    return keyset_page(response.data or [], limit, ('id',))
 
 
-def update_client(client_id: int, name: str = None, color: str = None):
+
+async def update_client(client_id: int, name: str = None, color: str = None):
     
     
     update_data = {}
@@ -43,12 +55,14 @@ def update_client(client_id: int, name: str = None, color: str = None):
         return {"error": "No se proporcionaron datos para actualizar"}
     
     try:
-        response = supabase.table('clients')\
+        response = await supabase.table('clients')\
             .update(update_data)\
             .eq('id', client_id)\
             .execute()
         
         if response.data:
+            collection_versions.bump('clients')
+            await report_cache.invalidate_clients([client_id])
             return {
                 "message": "Cliente actualizado exitosamente",
                 "client": response.data[0]
@@ -66,27 +80,28 @@ def update_client(client_id: int, name: str = None, color: str = None):
         }
     
 
-def remove_client(id: int):
+async def remove_client(id: int):
     try:
-        
-        response_client = supabase.table('clients').delete().eq('id', id).execute()
 
-        if response_client:
-           
-            response_tasks = supabase.table('tasks').select('id').eq('client_id', id).execute()
+        response = await supabase.rpc('delete_client_cascade', {'p_client_id': id}).execute()
 
-            if response_tasks.data:
-                for task in response_tasks.data:
-                    
-                    delete_task(task['id'])
+        deleted = response.data[0] if response.data else {'time_entries': 0, 'tasks': 0, 'clients': 0}
 
+        if not deleted['clients']:
             return {
-                'message': 'Cliente y tareas eliminados correctamente'
+                'error': 'Cliente no encontrado'
             }
 
+        collection_versions.bump('clients', 'tasks', 'time_entries')
+        await report_cache.invalidate_clients([id])
+
+        return {
+            'message': 'Cliente y tareas eliminados correctamente',
+            'deleted': deleted
+        }
+
     except Exception as e:
         return {
             'error': 'Error al eliminar el cliente',
             'details': str(e)
         }
-
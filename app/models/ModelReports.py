@@ -0,0 +1,54 @@
+
+from datetime import datetime
+from typing import Optional
+
+from app.database.data import supabase
+from app.services.hours_report import HoursReport, build_hours_report
+from app.services.report_cache import report_cache
+
+
+async def get_hours_report(start_date: datetime, end_date: datetime, client_id: Optional[int] = None) -> HoursReport:
+
+    """ get the hours per client and per task between two dates, summed in the database """
+
+    response = await supabase.rpc("hours_by_client", {
+        "p_start": start_date.isoformat(),
+        "p_end": end_date.isoformat(),
+        "p_client_id": client_id
+    }).execute()
+
+    return build_hours_report(response.data or [])
+
+
+async def get_cached_hours_report(start_date: datetime, end_date: datetime, client_id: Optional[int] = None) -> HoursReport:
+
+    """ get_hours_report through the report cache """
+
+    key = report_cache.key("hours_report", start_date, end_date, client_id)
+    report = await report_cache.get(key)
+
+    if report is not None:
+        return report
+
+    generation = report_cache.generation
+    report = await get_hours_report(start_date, end_date, client_id)
+
+    clients = report.client_ids + ([client_id] if client_id is not None else [])
+    await report_cache.set(key, report, start_date, end_date, clients, generation)
+
+    return report
+
+
+async def get_time_entries_with_clients(start_date: datetime, end_date: datetime):
+
+    """ get the start and end of the time entries started between two days, with the client name """
+
+    response = await (
+        supabase.table("time_entries")
+        .select("start_time, end_time, task_id, tasks(client_id, clients(name))")
+        .gte("start_time", start_date.strftime("%Y-%m-%d"))
+        .lte("start_time", end_date.strftime("%Y-%m-%d"))
+        .execute()
+    )
+
+    return response.data or []
@@ -0,0 +1,136 @@
+import asyncio
+import logging
+import os
+import sys
+from datetime import datetime
+from typing import List
+
+from app.database.data import supabase
+from app.services.pagination import fetch_all
+
+
+# maintain the daily rollup on time entry writes and read the reports from it,
+# enable once app/database/sql/time_entry_rollup.sql is applied and backfilled
+ROLLUP_ENABLED = os.getenv("TIME_ENTRY_ROLLUP", "false").lower() == "true"
+
+logger = logging.getLogger(__name__)
+
+
+def entry_hours(entry: dict) -> float:
+    """ hours of a time entry row, from the stored duration or its start and end """
+
+    if entry.get("duration") is not None:
+        return float(entry["duration"])
+
+    start_time = datetime.fromisoformat(str(entry["start_time"]))
+    end_time = datetime.fromisoformat(str(entry["end_time"]))
+
+    return (end_time - start_time).total_seconds() / 3600
+
+
+def rollup_change(entry: dict, sign: int) -> dict:
+    """ the change a created (sign 1) or removed (sign -1) time entry makes to its rollup row """
+
+    return {
+        "task_id": entry["task_id"],
+        "user_id": entry["user_id"],
+        "start_time": str(entry["start_time"]),
+        "hours": sign * entry_hours(entry),
+        "entries": sign
+    }
+
+
+async def apply_rollup(created: List[dict] = (), removed: List[dict] = ()):
+
+    """ add the created time entries to the daily rollup and subtract the removed ones in one statement """
+
+    if not ROLLUP_ENABLED:
+        return
+
+    changes = [rollup_change(entry, 1) for entry in created] + [rollup_change(entry, -1) for entry in removed]
+
+    if not changes:
+        return
+
+    try:
+        await supabase.rpc("apply_time_entry_rollup", {"p_changes": changes}).execute()
+    except Exception as e:
+        # the write itself succeeded, the drift is fixed by a rebuild
+        logger.warning("No se pudo actualizar el resumen diario de horas: %s", e)
+
+
+async def get_daily_client_hours(start_date: datetime, end_date: datetime):
+
+    """ get the hours per day and client from the rollup, in the shape of hours_by_date_and_client """
+
+    rows = await fetch_all(lambda: (
+        supabase.table("time_entry_rollup")
+        .select("day, client_id, user_id, task_id, hours, clients(name)")
+        .gte("day", start_date.strftime("%Y-%m-%d"))
+        .lt("day", end_date.strftime("%Y-%m-%d"))
+        .order("day")
+        .order("client_id")
+        .order("user_id")
+        .order("task_id")
+    ))
+
+    totals = {}
+
+    for row in rows:
+        client = (row.get("clients") or {}).get("name")
+        key = (row["day"], client)
+        totals[key] = totals.get(key, 0) + row["hours"]
+
+    return [
+        {"date": day, "client": client, "hours": hours}
+        for (day, client), hours in totals.items()
+    ]
+
+
+async def rebuild_rollup() -> int:
+
+    """ recompute the whole rollup from the time entries, return the number of rows """
+
+    response = await supabase.rpc("rebuild_time_entry_rollup", {}).execute()
+
+    return response.data[0]["rollup_rows"] if response.data else 0
+
+
+async def verify_rollup() -> list:
+
+    """ list the rollup rows that disagree with the time entries """
+
+    response = await supabase.rpc("time_entry_rollup_drift", {}).execute()
+
+    return response.data or []
+
+
+async def main(command: str) -> int:
+
+    try:
+        if command == "rebuild":
+            print(f"resumen diario reconstruido: {await rebuild_rollup()} filas")
+            return 0
+
+        drift = await verify_rollup()
+
+        for row in drift:
+            print(
+                f"{row['day']} usuario={row['user_id']} cliente={row['client_id']} tarea={row['task_id']} "
+                f"horas={row['expected_hours']} resumen={row['rollup_hours']} "
+                f"registros={row['expected_entries']} resumen={row['rollup_entries']}"
+            )
+
+        print(f"diferencias: {len(drift)}")
+        return 1 if drift else 0
+
+    finally:
+        await supabase.aclose()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2 or sys.argv[1] not in ("rebuild", "verify"):
+        print("uso: python -m app.models.ModelRollup rebuild|verify")
+        sys.exit(2)
+
+    sys.exit(asyncio.run(main(sys.argv[1])))
@@ -7,6 +7,9 @@ from fastapi import HTTPException
 from app.database.data import supabase
 
 from app.schemas.schemas import TaskCreate, TaskUpdate
+from app.services.pagination import cursor_value, keyset_page
+from app.services.report_cache import report_cache
+from app.services.versions import collection_versions
 
 
 
@@ -15,17 +18,20 @@ def format_datetime(dt: Optional[datetime]) -> Optional[str]:
     return dt.isoformat() if dt else None
 
 
-def create_task(task_data: TaskCreate):
+async def create_task(task_data: TaskCreate):
 
     """ creates a new task in the database """
 
     task_dict = task_data.dict()
     task_dict["due_date"] = format_datetime(task_data.due_date)
 
-    response = supabase.table("tasks").insert(task_dict).execute()
+    response = await supabase.table("tasks").insert(task_dict).execute()
 
     if response.data:
 
+        collection_versions.bump("tasks")
+        await report_cache.invalidate_clients([task_data.client_id])
+
         return response.data[0]
     
     else:
@@ -33,15 +39,55 @@ def create_task(task_data: TaskCreate):
         return {"error": response.error}
 
 
-def get_all_tasks():
-    """ get the task with the client and the user assigned """
-
-    response = supabase.table("tasks").select(
-        "id, title, status, due_date, client_id, clients(name), assigned_to_id, users(username)"
-    ).execute()
-
-    if not response.data:
-        return []
+TASK_COLUMNS = ("id", "client_id", "title", "description", "assigned_to_id", "status", "assignment_date", "due_date", "total_time")
+
+
+async def fetch_tasks_with_totals(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    client_id: Optional[int] = None,
+    assigned_to_id: Optional[int] = None,
+    due_from: Optional[datetime] = None,
+    due_to: Optional[datetime] = None,
+    after_id: Optional[int] = None,
+    limit: Optional[int] = None
+) -> list:
+    """ tasks with the hours logged between start and end, summed in app/database/sql/tasks_with_totals.sql """
+
+    response = await supabase.rpc("tasks_with_totals", {
+        "p_start": format_datetime(start),
+        "p_end": format_datetime(end),
+        "p_client_id": client_id,
+        "p_assigned_to_id": assigned_to_id,
+        "p_due_from": format_datetime(due_from),
+        "p_due_to": format_datetime(due_to),
+        "p_after_id": after_id,
+        "p_limit": limit
+    }).execute()
+
+    return response.data or []
+
+
+async def get_all_tasks(
+    limit: int,
+    cursor: Optional[dict] = None,
+    client_id: Optional[int] = None,
+    assigned_to_id: Optional[int] = None,
+    due_from: Optional[datetime] = None,
+    due_to: Optional[datetime] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+):
+    """ get a page of tasks with the client, the user assigned and the hours logged, and the cursor of the next page """
+
+    rows = await fetch_tasks_with_totals(
+        start, end, client_id, assigned_to_id, due_from, due_to,
+        after_id=cursor_value(cursor, "id", int) if cursor else None,
+        limit=limit + 1
+    )
+
+    if not rows:
+        return [], None
 
    
     tasks = [
@@ -50,26 +96,36 @@ def get_all_tasks():
             "title": task["title"],
             "status": task["status"],
             "due_date": task["due_date"],
-            "client": task["clients"]["name"] if task["clients"] else "Sin Cliente",
-            "assigned_to": task["users"]["username"] if task["users"] else "Sin Asignado"
+            "client": task["client_name"] or "Sin Cliente",
+            "assigned_to": task["assigned_to"] or "Sin Asignado",
+            "total_time": task["total_time"]
         }
-        for task in response.data
+        for task in rows
     ]
 
-    return tasks
+    return keyset_page(tasks, limit, ("id",))
+
+
+async def get_tasks_by_user_id(user_id: int, start: Optional[datetime] = None, end: Optional[datetime] = None):
 
+    """ get the tasks assigned to a user with the hours logged on each """
 
-def get_tasks_by_user_id(user_id: int):
+    rows = await fetch_tasks_with_totals(start, end, assigned_to_id=user_id)
 
-    """ get a task by user id """
+    return [{column: task[column] for column in TASK_COLUMNS} for task in rows]
 
-    response = supabase.table("tasks").select("*").eq("assigned_to_id", user_id).execute()
 
-    return response.data
 
+async def task_exists(task_id: int) -> bool:
 
+    """ check a task id without fetching the task """
 
-def update_task(task_id: int, task_data: TaskUpdate):
+    response = await supabase.table("tasks").select("id").eq("id", task_id).limit(1).execute()
+
+    return bool(response.data)
+
+
+async def update_task(task_id: int, task_data: TaskUpdate):
     """ Update a task by id """
     
     task_dict = task_data.dict(exclude_unset=True)
@@ -84,29 +140,33 @@ def update_task(task_id: int, task_data: TaskUpdate):
    
     task_dict["due_date"] = format_datetime(task_dict["due_date"])
 
-    response = supabase.table("tasks").update(task_dict).eq("id", task_id).execute()
+    response = await supabase.table("tasks").update(task_dict).eq("id", task_id).execute()
 
     if response.data:
+        collection_versions.bump("tasks")
+        await report_cache.invalidate_clients(task["client_id"] for task in response.data)
         return response.data
     else:
         raise HTTPException(status_code=400, detail=response.error)
     
 
-def delete_task(task_id: int):
+async def delete_task(task_id: int):
 
-    """ remove a tasks """
+    """ remove a task and its time entries in one transaction """
 
-    response_time_entries = supabase.table("time_entries").delete().eq("task_id", task_id).execute()
+    task = await supabase.table("tasks").select("client_id").eq("id", task_id).execute()
 
-    if not response_time_entries.data:
-        return {"error": response_time_entries.error}
+    response = await supabase.rpc("delete_task_cascade", {"p_task_id": task_id}).execute()
 
-    response = supabase.table("tasks").delete().eq("id", task_id).execute()
+    deleted = response.data[0] if response.data else {"time_entries": 0, "tasks": 0}
 
-    if response.data:
+    if deleted["tasks"]:
+
+        collection_versions.bump("tasks", "time_entries")
+        await report_cache.invalidate_clients(row["client_id"] for row in task.data or [])
 
-        return {"message": "Tarea eliminada correctamente"}
+        return {"message": "Tarea eliminada correctamente", "deleted": deleted}
     
     else:
 
-        return {"error": response.error}
\ No newline at end of file
+        return {"error": "Tarea no encontrada"}
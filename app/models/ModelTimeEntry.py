@@ -1,7 +1,13 @@
 
 from app.database.data import supabase
 from datetime import datetime
+from typing import Dict, List, Optional
+from postgrest.exceptions import APIError
+from app.models.ModelRollup import apply_rollup
 from app.schemas.schemas import TimeEntryCreate, TimeEntryUpdate
+from app.services.pagination import cursor_value, decode_cursor, keyset_page
+from app.services.report_cache import report_cache
+from app.services.versions import collection_versions
 
 
 def calculate_duration(start_time: datetime, end_time: datetime) -> float:
@@ -10,74 +16,364 @@ def calculate_duration(start_time: datetime, end_time: datetime) -> float:
     return (end_time - start_time).total_seconds() / 3600
 
 
-def create_time_entry(user_id: int, entry_data: TimeEntryCreate):
+async def record_changes(created: List[dict] = (), removed: List[dict] = ()):
 
-    """ create a new time entry in supabase """
+    """ propagate written time entries to the daily rollup, the report cache and the listing ETags """
+
+    if created or removed:
+        collection_versions.bump("time_entries")
+
+    await apply_rollup(created=created, removed=removed)
+    await report_cache.invalidate_entries(list(created) + list(removed))
+
+
+# sqlstate of the time_entries_no_overlap exclusion constraint, see app/database/sql/time_entry_overlap.sql
+EXCLUSION_VIOLATION = "23P01"
+
+OVERLAP_ERROR = "El registro se cruza con otro registro de tiempo del usuario."
+
+CHECK_VIOLATION = "23514"
+
+FOREIGN_KEY_VIOLATION = "23503"
+
+INVALID_INTERVAL_ERROR = "La hora de inicio debe ser menor a la hora de finalización."
+
+
+def overlap_error(conflict: dict) -> dict:
+
+    """ the error returned for an interval that overlaps an existing entry, the routes answer it with 409 """
+
+    return {
+        "error": f"El registro se cruza con el registro {conflict['id']} ({conflict['start_time']} - {conflict['end_time']}).",
+        "conflict": conflict
+    }
+
+
+async def find_overlaps(user_id: int, intervals: List[tuple], exclude_id: Optional[int] = None) -> Dict[int, dict]:
+
+    """ the first existing entry of the user overlapping each (start, end) interval, by position, in one round trip """
+
+    response = await supabase.rpc("time_entry_overlaps", {
+        "p_user_id": user_id,
+        "p_intervals": [
+            {"start_time": start_time.isoformat(), "end_time": end_time.isoformat()}
+            for start_time, end_time in intervals
+        ],
+        "p_exclude_id": exclude_id
+    }).execute()
+
+    return {row["idx"]: row for row in response.data or []}
+
+
+async def create_time_entry(user_id: int, entry_data: TimeEntryCreate):
+
+    """ create a new time entry in supabase, rejecting it when it overlaps another entry of the user """
 
     if entry_data.start_time >= entry_data.end_time:
 
         return {"error": "La hora de inicio debe ser menor a la hora de finalización."}
 
-    duration = calculate_duration(entry_data.start_time, entry_data.end_time)
+    overlaps = await find_overlaps(user_id, [(entry_data.start_time, entry_data.end_time)])
 
-    response = supabase.table("time_entries").insert({
-        
-        "task_id": entry_data.task_id,
-        "user_id": user_id,
-        "start_time": entry_data.start_time.isoformat(),
-        "end_time": entry_data.end_time.isoformat()
+    if overlaps:
 
-    }).execute()
+        return overlap_error(overlaps[0])
+
+    try:
+        response = await supabase.table("time_entries").insert(entry_row(user_id, entry_data)).execute()
+    except APIError as e:
+        # a concurrent write took the interval after the check
+        if e.code == EXCLUSION_VIOLATION:
+            return {"error": OVERLAP_ERROR, "conflict": None}
+        raise
 
     if response.data:
 
+        await record_changes(created=response.data)
+
         return response.data[0]
     
     else:
 
         return {"error": response.error}
+
+
+def entry_row(user_id: int, entry_data: TimeEntryCreate) -> dict:
+
+    """ build the row inserted for a time entry """
+
+    return {
+        "task_id": entry_data.task_id,
+        "user_id": user_id,
+        "start_time": entry_data.start_time.isoformat(),
+        "end_time": entry_data.end_time.isoformat()
+    }
+
+
+async def create_time_entries(user_id: int, entries: List[TimeEntryCreate]):
+
+    """ validate a batch of time entries in one pass and insert the valid ones with a single multi-row insert
+
+    When a constraint rejects the insert the entries are inserted one by
+    one, so each result tells whether that entry was saved and why not.
+    """
+
+    results = [None] * len(entries)
+    accepted = []
+    previous = None
+
+    for index in sorted(range(len(entries)), key=lambda i: entries[i].start_time):
+
+        entry_data = entries[index]
+
+        if entry_data.start_time >= entry_data.end_time:
+            results[index] = {"index": index, "status": "rejected", "error": "La hora de inicio debe ser menor a la hora de finalización."}
+            continue
+
+        if previous is not None and entry_data.start_time < entries[previous].end_time:
+            results[index] = {"index": index, "status": "rejected", "error": f"El registro se cruza con el registro {previous} del lote."}
+            continue
+
+        accepted.append(index)
+        previous = index
+
+    overlaps = await find_overlaps(
+        user_id, [(entries[index].start_time, entries[index].end_time) for index in accepted]
+    ) if accepted else {}
+
+    for position, conflict in overlaps.items():
+        index = accepted[position]
+        results[index] = {"index": index, "status": "rejected", "error": overlap_error(conflict)["error"]}
+
+    accepted = [index for position, index in enumerate(accepted) if position not in overlaps]
+
+    if not accepted:
+        return results
+
+    try:
+        response = await supabase.table("time_entries").insert(
+            [entry_row(user_id, entries[index]) for index in accepted]
+        ).execute()
+        inserted = dict(zip(accepted, response.data or []))
+        errors = {}
+    except Exception as e:
+        if is_integrity_error(e):
+            # the database rejected some row, insert them one by one to tell which
+            inserted, errors = await insert_one_by_one(user_id, entries, accepted)
+        else:
+            inserted, errors = {}, {index: str(e) for index in accepted}
+
+    await record_changes(created=list(inserted.values()))
+
+    for index in accepted:
+        if index in inserted:
+            results[index] = {"index": index, "status": "created", "entry": inserted[index]}
+        else:
+            results[index] = {"index": index, "status": "error", "error": errors.get(index, "No se pudo registrar el tiempo.")}
+
+    return results
+
+
+async def insert_one_by_one(user_id: int, entries: List[TimeEntryCreate], accepted: List[int]):
+
+    """ insert each accepted entry on its own, return the rows created and the errors, by index """
+
+    inserted, errors = {}, {}
+
+    for index in accepted:
+        try:
+            response = await supabase.table("time_entries").insert(entry_row(user_id, entries[index])).execute()
+        except Exception as e:
+            errors[index] = integrity_error(e) if is_integrity_error(e) else str(e)
+            continue
+
+        if response.data:
+            inserted[index] = response.data[0]
+
+    return inserted, errors
+
+
+def is_integrity_error(error: Exception) -> bool:
+
+    """ a constraint rejected the row (sqlstate class 23), inserting it again fails the same way """
+
+    return isinstance(error, APIError) and str(error.code or "").startswith("23")
+
+
+def integrity_error(error: APIError) -> str:
+
+    """ the message of a time entry rejected by a constraint """
+
+    if error.code == EXCLUSION_VIOLATION:
+        return OVERLAP_ERROR
+
+    if error.code == FOREIGN_KEY_VIOLATION:
+        return "La tarea no existe."
+
+    return error.message
     
 
-def get_all_time_entries():
+async def get_all_time_entries(
+    limit: int,
+    cursor: Optional[dict] = None,
+    user_id: Optional[int] = None,
+    task_id: Optional[int] = None,
+    client_id: Optional[int] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+):
+
+    """ get a page of time entries ordered by start time, and the cursor of the next page """
+
+    columns = "*, tasks!inner(client_id)" if client_id is not None else "*"
+    query = filter_time_entries(
+        supabase.table("time_entries").select(columns), user_id, task_id, client_id, start_date, end_date
+    )
+
+    if cursor:
+        start_time = cursor_value(cursor, "start_time", lambda value: datetime.fromisoformat(value).isoformat())
+        entry_id = cursor_value(cursor, "id", int)
+        query = query.or_(f'start_time.gt."{start_time}",and(start_time.eq."{start_time}",id.gt.{entry_id})')
+
+    response = await query.order("start_time").order("id").limit(limit + 1).execute()
+
+    return keyset_page(response.data or [], limit, ("start_time", "id"))
+
+
+def filter_time_entries(query, user_id=None, task_id=None, client_id=None, start_date=None, end_date=None):
+
+    """ apply the time entry list filters, the client one needs tasks!inner(client_id) in the select """
+
+    if user_id is not None:
+        query = query.eq("user_id", user_id)
+
+    if task_id is not None:
+        query = query.eq("task_id", task_id)
+
+    if client_id is not None:
+        query = query.eq("tasks.client_id", client_id)
+
+    if start_date is not None:
+        query = query.gte("start_time", start_date.isoformat())
+
+    if end_date is not None:
+        query = query.lte("start_time", end_date.isoformat())
 
-    """ get all the time entries """
+    return query
 
-    response = supabase.table("time_entries").select("*").execute()
 
-    return response.data if response.data else []
+async def count_time_entries(client_id: Optional[int] = None, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None) -> int:
 
-def get_time_entry(entry_id: int):
+    """ count the time entries matching the filters without fetching them """
+
+    columns = "id, tasks!inner(client_id)" if client_id is not None else "id"
+    query = filter_time_entries(
+        supabase.table("time_entries").select(columns, count="exact"), client_id=client_id, start_date=start_date, end_date=end_date
+    )
+    response = await query.limit(1).execute()
+
+    return response.count or 0
+
+
+async def iter_time_entries(
+    page_size: int,
+    client_id: Optional[int] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+):
+
+    """ yield every time entry matching the filters, one keyset page at a time """
+
+    cursor = None
+
+    while True:
+        entries, next_cursor = await get_all_time_entries(
+            page_size, cursor, client_id=client_id, start_date=start_date, end_date=end_date
+        )
+
+        yield entries
+
+        if not next_cursor:
+            return
+
+        cursor = decode_cursor(next_cursor)
+
+
+async def get_time_entry(entry_id: int):
 
     """ get a time entry by the id"""
     
-    response = supabase.table("time_entries").select("*").eq("id", entry_id).execute()
+    response = await supabase.table("time_entries").select("*").eq("id", entry_id).execute()
 
     return response.data[0] if response.data else None
 
-def update_time_entry(entry_id: int, entry_data: TimeEntryUpdate):
+async def update_time_entry(entry_id: int, entry_data: TimeEntryUpdate):
+
+    """ update the times of a time entry, rejecting new times that overlap another entry of the same user
+
+    The write returns the row it replaced, so the rollup and the report
+    cache are adjusted against it even when the entry is updated
+    concurrently, see app/database/sql/update_time_entry.sql.
+    """
 
-    """ update a time entry """
+    previous = await get_time_entry(entry_id)
+
+    if not previous:
+
+        return {"error": "Registro de tiempo no encontrado"}
 
     update_data = entry_data.dict(exclude_unset=True)
-    
-    if "start_time" in update_data and "end_time" in update_data:
 
-        if update_data["start_time"] >= update_data["end_time"]:
+    # timestamp columns keep the wall clock time, compare without the utc offset
+    new_start = update_data["start_time"].replace(tzinfo=None) if update_data.get("start_time") else None
+    new_end = update_data["end_time"].replace(tzinfo=None) if update_data.get("end_time") else None
+
+    if new_start or new_end:
+
+        start_time = new_start or datetime.fromisoformat(previous["start_time"])
+        end_time = new_end or datetime.fromisoformat(previous["end_time"])
+
+        if start_time >= end_time:
+
+            return {"error": INVALID_INTERVAL_ERROR}
+
+        overlaps = await find_overlaps(previous["user_id"], [(start_time, end_time)], exclude_id=entry_id)
+
+        if overlaps:
+
+            return overlap_error(overlaps[0])
+
+    try:
+        response = await supabase.rpc("update_time_entry_times", {
+            "p_entry_id": entry_id,
+            "p_start_time": new_start.isoformat() if new_start else None,
+            "p_end_time": new_end.isoformat() if new_end else None
+        }).execute()
+    except APIError as e:
+        if e.code == EXCLUSION_VIOLATION:
+            return {"error": OVERLAP_ERROR, "conflict": None}
+        # a concurrent update of the other end left the interval empty
+        if e.code == CHECK_VIOLATION:
+            return {"error": INVALID_INTERVAL_ERROR}
+        raise
+
+    if not response.data:
+
+        return {"error": "Registro de tiempo no encontrado"}
 
-            return {"error": "La hora de inicio debe ser menor a la hora de finalización."}
-        
-        update_data["duration"] = calculate_duration(update_data["start_time"], update_data["end_time"])
+    change = response.data[0]
 
-    response = supabase.table("time_entries").update(update_data).eq("id", entry_id).execute()
+    await record_changes(created=[change["new_entry"]], removed=[change["old_entry"]])
 
-    return response.data[0] if response.data else {"error": response.error}
+    return change["new_entry"]
 
-def delete_time_entry(entry_id: int):
+async def delete_time_entry(entry_id: int):
 
     """ Delete a time Entry """
     
     try:
-        response = supabase.table("time_entries").delete().eq("id", entry_id).execute()
+        response = await supabase.table("time_entries").delete().eq("id", entry_id).execute()
+        await record_changes(removed=response.data or [])
         return {"message": "Registro de tiempo eliminado correctamente"} if response.data else {"error": response.error}
     except Exception as e:
         # Check for the specific "relation task does not exist" error
@@ -1,6 +1,8 @@
 
+from typing import Optional
 from ..database.data import supabase  
-from app.services.utils import hash_password
+from app.services.pagination import cursor_value, keyset_page
+from app.services.utils import hash_password_async, invalidate_user
 
 
 ROLE_CODES = {
@@ -12,12 +14,12 @@ ROLE_CODES = {
 }
 
 
-def create_user(username: str, password: str, role_code: str):
+async def create_user(username: str, password: str, role_code: str):
     """ Creates an user with a role """
-    hashed_password = hash_password(password)
+    hashed_password = await hash_password_async(password)
 
     
-    response = supabase.table("users").insert({
+    response = await supabase.table("users").insert({
         "username": username,
         "hashed_password": hashed_password,
         "role": role_code  
@@ -26,13 +28,21 @@ def create_user(username: str, password: str, role_code: str):
     print("Response:", response)
     
     if response.data:
+        for user in response.data:
+            invalidate_user(user["id"])
         return {"message": "Usuario creado exitosamente", "user": response.data}
     else:
         return {"error": "Error al crear el usuario", "details": response.error}
 
-def get_user(username: str):
+async def update_password_hash(user_id: int, hashed_password: str):
+    """ replace the stored password hash of an user """
+    response = await supabase.table("users").update({"hashed_password": hashed_password}).eq("id", user_id).execute()
+    invalidate_user(user_id)
+    return response.data[0] if response.data else None
+
+async def get_user(username: str):
     """ get all the data of an user by username """
-    response = supabase.table("users").select("id,username, hashed_password,role").eq("username", username).execute()
+    response = await supabase.table("users").select("id,username, hashed_password,role").eq("username", username).execute()
     if response.data:
         return response.data[0]  
     else:
@@ -40,11 +50,19 @@ def get_user(username: str):
     
 
 
-def get_all_users():
-    """ get all the users in the database """
-    response = supabase.table("users").select("*").execute()
+async def get_all_users(limit: int, cursor: Optional[dict] = None, role: Optional[str] = None):
+    """ get a page of users in the database, and the cursor of the next page """
+    query = supabase.table("users").select("*")
+
+    if role is not None:
+        query = query.eq("role", role)
+
+    if cursor:
+        query = query.gt("id", cursor_value(cursor, "id", int))
+
+    response = await query.order("id").limit(limit + 1).execute()
     if response.data:
-        return response.data
+        return keyset_page(response.data, limit, ("id",))
     else:
-        return None
+        return None, None
 
@@ -1,11 +1,16 @@
 
 
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException
+from datetime import datetime
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Response
+from fastapi.responses import ORJSONResponse
 from fastapi.security import OAuth2PasswordBearer
-from app.models.ModelTimeEntry import create_time_entry, delete_time_entry, get_all_time_entries, get_time_entry, update_time_entry
-from app.schemas.schemas import TimeEntryCreate, TimeEntryResponse, TimeEntryUpdate
+from app.models.ModelTimeEntry import create_time_entries, create_time_entry, delete_time_entry, get_all_time_entries, get_time_entry, update_time_entry
+from app.schemas.schemas import TimeEntryBulkCreate, TimeEntryBulkResult, TimeEntryCreate, TimeEntryResponse, TimeEntryUpdate
+from app.services.pagination import PageParams, set_next_cursor
+from app.services.responses import trusted_rows
 from app.services.utils import get_current_user
+from app.services.write_behind import WriteBehindFull, time_entry_writer
 
 
 router = APIRouter(prefix="/timeEntry", tags=["Time Entries"])
@@ -15,11 +20,30 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/users/login")
 
 
 @router.post("/create", response_model=TimeEntryResponse)
-async def create_time_entry_endpoint(entry_data: TimeEntryCreate, user: dict = Depends(get_current_user)):
+async def create_time_entry_endpoint(entry_data: TimeEntryCreate, response: Response, user: dict = Depends(get_current_user)):
 
-    """ register the time in a task """
+    """ register the time in a task, 409 when it overlaps another entry of the user
 
-    entry = create_time_entry(user["id"], entry_data)
+    With TIME_ENTRY_WRITE_BEHIND the entry is queued and answered with 202
+    and a negative provisional id, see /timeEntry/queued/{entry_id}.
+    """
+
+    if time_entry_writer.enabled:
+
+        try:
+            entry = await time_entry_writer.submit(user["id"], entry_data)
+        except WriteBehindFull:
+            raise HTTPException(status_code=503, detail="Demasiados registros pendientes, intenta de nuevo.", headers={"Retry-After": "1"})
+
+        response.status_code = 202
+
+    else:
+
+        entry = await create_time_entry(user["id"], entry_data)
+
+    if "conflict" in entry:
+
+        raise HTTPException(status_code=409, detail=entry["error"])
 
     if "error" in entry:
 
@@ -28,12 +52,56 @@ async def create_time_entry_endpoint(entry_data: TimeEntryCreate, user: dict = D
     return entry
 
 
+@router.post("/bulk", response_model=List[TimeEntryBulkResult])
+async def create_time_entries_endpoint(bulk_data: TimeEntryBulkCreate, user: dict = Depends(get_current_user)):
+
+    """ register a batch of time entries in one request, with a result per entry """
+
+    return await create_time_entries(user["id"], bulk_data.entries)
+
+
 @router.get("/get_all_time_entries", response_model=List[TimeEntryResponse])
-async def get_time_entries_endpoint():
+async def get_time_entries_endpoint(
+    page: PageParams = Depends(),
+    user_id: Optional[int] = None,
+    task_id: Optional[int] = None,
+    client_id: Optional[int] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+):
+
+    """ get a page of time entries, the next page cursor is sent in the X-Next-Cursor header
+
+    The rows come straight from time_entries, they are serialized with
+    orjson without validating each one against TimeEntryResponse.
+    """
 
-    """ get all time entries"""
+    entries, next_cursor = await get_all_time_entries(
+        page.limit, page.cursor, user_id, task_id, client_id, start_date, end_date
+    )
 
-    return get_all_time_entries()
+    response = ORJSONResponse(trusted_rows(entries, TimeEntryResponse))
+
+    set_next_cursor(response, next_cursor)
+
+    return response
+
+
+@router.get("/queued/{entry_id}")
+async def queued_time_entry_endpoint(entry_id: int, user: dict = Depends(get_current_user)):
+
+    """ outcome of a queued time entry by its provisional id: pendiente, guardado with the id, or error
+
+    Only the user who queued the entry sees it, any other gets 404.
+    """
+
+    outcome = time_entry_writer.status(entry_id, user["id"])
+
+    if outcome is None:
+
+        raise HTTPException(status_code=404, detail="Registro pendiente no encontrado")
+
+    return outcome
 
 
 @router.get("/get_time_entry/{entry_id}", response_model=TimeEntryResponse)
@@ -41,7 +109,7 @@ async def get_time_entry_endpoint(entry_id: int):
 
     """ get a time entrie by the id """
 
-    entry = get_time_entry(entry_id)
+    entry = await get_time_entry(entry_id)
 
     if not entry:
 
@@ -55,7 +123,11 @@ async def update_time_entry_endpoint(entry_id: int, entry_data: TimeEntryUpdate)
 
     """ update a time entry"""
 
-    entry = update_time_entry(entry_id, entry_data)
+    entry = await update_time_entry(entry_id, entry_data)
+
+    if "conflict" in entry:
+
+        raise HTTPException(status_code=409, detail=entry["error"])
 
     if "error" in entry:
 
@@ -69,7 +141,7 @@ async def delete_time_entry_endpoint(entry_id: int):
 
     """ delete a time entry """
 
-    result = delete_time_entry(entry_id)
+    result = await delete_time_entry(entry_id)
 
     if "error" in result:
 
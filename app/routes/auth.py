@@ -1,19 +1,43 @@
 from datetime import timedelta
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from app.models.ModelUser import create_user, get_all_users, get_user, ROLE_CODES
-from app.services.utils import create_access_token, get_current_user, verify_password
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from fastapi.security import OAuth2PasswordRequestForm
+from app.models.ModelUser import create_user, get_all_users, get_user, update_password_hash, ROLE_CODES
+from app.services.pagination import PageParams, set_next_cursor
+from app.services.revocation import revoked_tokens
+from app.services.utils import (
+    ACCESS_TOKEN_MINUTES, create_access_token, create_refresh_token, decode_access_token,
+    get_current_user, get_user_by_id, oauth2_scheme, verify_password_async
+)
 from pydantic import BaseModel
 
 router = APIRouter(prefix="/users", tags=["usuarios"])
 
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/users/login")
-
 class UserCreate(BaseModel):
     username: str
     password: str
     role_code: str  
 
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+
+class LogoutRequest(BaseModel):
+    refresh_token: Optional[str] = None
+
+
+def issue_tokens(user: dict) -> dict:
+    """ access and refresh tokens carrying the id, username and role of the user """
+    claims = {"sub": user["id"], "role": user["role"], "username": user["username"]}
+
+    return {
+        "access_token": create_access_token(claims),
+        "refresh_token": create_refresh_token(claims),
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_MINUTES * 60
+    }
+
 @router.post("/register", status_code=status.HTTP_201_CREATED)
 async def register_user(user_data: UserCreate):
     """Register a user with a role based in a code"""
@@ -22,7 +46,7 @@ async def register_user(user_data: UserCreate):
     if not role:
         raise HTTPException(status_code=400, detail="Código de rol inválido.")
 
-    user = create_user(user_data.username, user_data.password, role)
+    user = await create_user(user_data.username, user_data.password, role)
     if not user:
         raise HTTPException(status_code=400, detail="No se pudo crear el usuario")
 
@@ -31,16 +55,53 @@ async def register_user(user_data: UserCreate):
 @router.post("/login")
 async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     """Verify credentials and returns the acces token"""
-    user = get_user(form_data.username)
-    if not user or not verify_password(form_data.password, user["hashed_password"]):
+    user = await get_user(form_data.username)
+    if not user:
         raise HTTPException(status_code=401, detail="Usuario o contraseña incorrectos")
 
-    
-    access_token = create_access_token(
-        data={"sub": user["id"], "role": user["role"]}
-    )
+    valid, new_hash = await verify_password_async(form_data.password, user["hashed_password"])
+    if not valid:
+        raise HTTPException(status_code=401, detail="Usuario o contraseña incorrectos")
+
+    if new_hash:
+        await update_password_hash(user["id"], new_hash)
+
+    return {**issue_tokens(user), "role": user["role"], "user_id": user['id'], "username": user['username']}
 
-    return {"access_token": access_token, "token_type": "bearer", "role": user["role"],"user_id": user['id'], "username": user['username']}
+
+@router.post("/refresh")
+async def refresh_token(data: RefreshRequest):
+    """Exchange a refresh token for a new pair of tokens, the used refresh token is revoked"""
+    claims = decode_access_token(data.refresh_token)
+
+    if not claims or claims.get("type") != "refresh" or revoked_tokens.is_revoked(claims.get("jti")):
+        raise HTTPException(status_code=401, detail="Token inválido o expirado")
+
+    # read the user again so a changed role or a deleted user takes effect on refresh
+    user = await get_user_by_id(int(claims["sub"]))
+    if not user:
+        raise HTTPException(status_code=401, detail="Usuario no encontrado")
+
+    # a concurrent refresh with the same token already rotated it, only one gets a new pair
+    if not await revoked_tokens.revoke(claims["jti"], user["id"], claims["exp"]):
+        raise HTTPException(status_code=401, detail="Token inválido o expirado")
+
+    return {**issue_tokens(user), "role": user["role"], "user_id": user['id'], "username": user['username']}
+
+
+@router.post("/logout")
+async def logout(data: Optional[LogoutRequest] = None, token: str = Depends(oauth2_scheme), user: dict = Depends(get_current_user)):
+    """Revoke the access token used and, when sent, the refresh token"""
+    tokens = [decode_access_token(token)]
+
+    if data and data.refresh_token:
+        tokens.append(decode_access_token(data.refresh_token))
+
+    for claims in tokens:
+        if claims and claims.get("jti") and str(claims.get("sub")) == str(user["id"]):
+            await revoked_tokens.revoke(claims["jti"], user["id"], claims["exp"])
+
+    return {"message": "Sesión cerrada correctamente"}
 
 @router.get("/me", status_code=status.HTTP_200_OK)
 async def read_current_user(user: dict = Depends(get_current_user)):
@@ -52,12 +113,19 @@ async def read_current_user(user: dict = Depends(get_current_user)):
 
 
 @router.get("/get_all_users")
-async def read_all_users(user: dict = Depends(get_current_user)):
-    """Get all the users in the database
+async def read_all_users(
+    response: Response,
+    page: PageParams = Depends(),
+    role: Optional[str] = None,
+    user: dict = Depends(get_current_user)
+):
+    """Get a page of the users in the database, the next page cursor is sent in the X-Next-Cursor header
     """
     if not user:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
 
-    response = get_all_users()
+    users, next_cursor = await get_all_users(page.limit, page.cursor, role)
+
+    set_next_cursor(response, next_cursor)
 
-    return response
+    return users
@@ -1,10 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Response
 from fastapi.security import OAuth2PasswordBearer
 from pydantic import BaseModel
 
 from app.models.ModelClients import create_client, read_clients, remove_client, update_client
 from app.schemas.schemas import clientCreate, clientDelete, clientUpdate
-from app.services.utils import payload, role_required
+from app.services.pagination import PageParams, set_next_cursor
+from app.services.utils import get_current_user, role_required
+from app.services.versions import listing_etag
 
 
 router = APIRouter(prefix="/clients", tags=["clients"])
@@ -15,18 +18,17 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/users/login")
 
 
 @router.post('/create')
-async def addClient(client_data: clientCreate, user: dict = Depends(role_required(['socio', 'senior'])), token: str = Depends(oauth2_scheme)):
+async def addClient(client_data: clientCreate, user: dict = Depends(role_required(['socio', 'senior'])), user_data: dict = Depends(get_current_user)):
     
     """ Create a client and save it in database"""
     
-    user_data = payload(token)
         
 
     if not user_data or "id" not in user_data:
         raise HTTPException(status_code=401, detail="Usuario no autenticado")
     
 
-    response = create_client(client_data.name,client_data.color)
+    response = await create_client(client_data.name,client_data.color)
 
     if not response:
         raise HTTPException(status_code=500, detail='cannot create client')
@@ -37,38 +39,45 @@ async def addClient(client_data: clientCreate, user: dict = Depends(role_require
 
 
 @router.get('/get_clients_admin')
-async def get_clients_admin(user: dict = Depends(role_required(['socio', 'senior'])), token: str = Depends(oauth2_scheme)):
+async def get_clients_admin(
+    response: Response,
+    page: PageParams = Depends(),
+    name: Optional[str] = None,
+    user: dict = Depends(role_required(['socio', 'senior'])),
+    user_data: dict = Depends(get_current_user),
+    etag: str = Depends(listing_etag('clients'))
+):
 
-    """ Get all the clients in the database """
+    """ Get a page of the clients in the database, the next page cursor is sent in the X-Next-Cursor header """
 
 
-    user_data = payload(token)
 
 
     if not user_data:
         raise HTTPException(status_code=401, detail="Usuario no autenticado")
 
 
-    response = read_clients()
+    clients, next_cursor = await read_clients(page.limit, page.cursor, name)
 
-    return response
+    set_next_cursor(response, next_cursor)
+
+    return clients
 
 
 @router.put('/update_client')
-async def client_update(update_data: clientUpdate, user: dict = Depends(role_required(['socio', 'senior'])), token: str = Depends(oauth2_scheme)):
+async def client_update(update_data: clientUpdate, user: dict = Depends(role_required(['socio', 'senior'])), user_data: dict = Depends(get_current_user)):
 
 
     """update the clients info"""
 
 
-    user_data = payload(token)
 
 
     if not user_data:
         raise HTTPException(status_code=401, detail="Usuario no autenticado")
 
 
-    response = update_client(update_data.id ,update_data.name, update_data.color)
+    response = await update_client(update_data.id ,update_data.name, update_data.color)
 
 
     return response
@@ -76,18 +85,17 @@ async def client_update(update_data: clientUpdate, user: dict = Depends(role_req
 
 
 @router.delete('/delete_client')
-async def delete_client(delete_data: clientDelete, user: dict = Depends(role_required(['socio', 'senior'])), token: str = Depends(oauth2_scheme)):
+async def delete_client(delete_data: clientDelete, user: dict = Depends(role_required(['socio', 'senior'])), user_data: dict = Depends(get_current_user)):
     
     """ delete a client with their assigments """
 
-    user_data = payload(token)
 
 
     if not user_data:
         raise HTTPException(status_code=401, detail="Usuario no autenticado")
     
 
-    response = remove_client(delete_data.id)
+    response = await remove_client(delete_data.id)
 
 
     return response
@@ -1,189 +1,101 @@
-from fastapi import APIRouter, HTTPException, Depends
+import asyncio
+from fastapi import APIRouter, HTTPException, Depends, Query
 from fastapi.security import OAuth2PasswordBearer
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional, Union
 from datetime import datetime
 from app.database.data import supabase
-from app.schemas.schemas import ClientReportRequest, ClientReportRequestTimeEntries, ReportRequest
+from app.models.ModelReports import get_cached_hours_report, get_time_entries_with_clients
+from app.models.ModelRollup import ROLLUP_ENABLED, get_daily_client_hours
+from app.models.ModelTimeEntry import count_time_entries, iter_time_entries
+from app.schemas.schemas import ClientReportRequest, ClientReportRequestTimeEntries, ExportRequest, ReportRequest
+from app.services.timesheet import hours_by_date_and_client
+from app.services.export import (
+    CSV_MEDIA_TYPE, EXPORT_PAGE_SIZE, PARQUET_MEDIA_TYPE, XLSX_MEDIA_TYPE,
+    rows_from_pages, stream_csv, stream_parquet, stream_workbook, write_hours_report, write_table
+)
+from app.services.hours_report import HoursReport, render_csv, render_flat_rows, render_json, render_rows
+from app.services.jobs import DONE, ReportJob, ReportJobQueueFull, report_jobs
+from app.services.report_cache import report_cache
 from app.services.utils import role_required
-import pandas as pd
-import io
-from fastapi.responses import StreamingResponse
+from fastapi.responses import FileResponse, ORJSONResponse, Response, StreamingResponse
 
 router = APIRouter(prefix="/reports", tags=["Reportes"])
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/users/login")
 
 
-def parse_datetime(date_str):
-    """Parse a datetime string with or without milliseconds."""
-    try:
-        # Try parsing with milliseconds
-        return datetime.strptime(date_str, "%Y-%m-%dT%H:%M:%S.%f")
-    except ValueError:
-        # Fallback to parsing without milliseconds
-        return datetime.strptime(date_str, "%Y-%m-%dT%H:%M:%S")
-
-
 @router.post("/hours_by_client/", response_model=List[dict])
 async def get_hours_by_client(
     request: ReportRequest,
     user: dict = Depends(role_required(["socio", "senior", "consultor"]))
 ):
     """get the report of the client between two dates"""
-    
-    
-    response = supabase.table("time_entries") \
-        .select("task_id, duration, start_time, end_time") \
-        .gte("start_time", request.start_date.isoformat()) \
-        .lte("end_time", request.end_date.isoformat()) \
-        .execute()
 
-    if not response.data:
+    report = await get_cached_hours_report(request.start_date, request.end_date)
+
+    if not report.clients:
         raise HTTPException(status_code=404, detail="No hay datos en el rango de fechas seleccionado")
-   
-    
-    task_response = supabase.table("tasks").select("id, client_id, title").execute()
-    task_dict = {task["id"]: {"client_id": task["client_id"], "title": task["title"]} for task in task_response.data}
-
-    client_hours = {}
-   
-    for entry in response.data:
-        task_id = entry["task_id"]
-        task_info = task_dict.get(task_id, None)
-        if task_info:
-            client_id = task_info["client_id"]
-            task_title = task_info["title"]
-            
-            if client_id not in client_hours:
-                client_hours[client_id] = {"total_hours": 0, "tasks": {}}
-            
-            client_hours[client_id]["total_hours"] += entry["duration"]
-            
-            if task_title not in client_hours[client_id]["tasks"]:
-                client_hours[client_id]["tasks"][task_title] = 0
-            client_hours[client_id]["tasks"][task_title] += entry["duration"]
-
-   
-    for task in task_response.data:
-        client_id = task["client_id"]
-        task_title = task["title"]
-       
-        if client_id in client_hours:
-            if task_title not in client_hours[client_id]["tasks"]:
-                client_hours[client_id]["tasks"][task_title] = 0
-
-   
-    client_response = supabase.table("clients").select("id, name").execute()
-    client_dict = {client["id"]: client["name"] for client in client_response.data}
-
-    report_data = []
-    for client_id, data in client_hours.items():
-        client_name = client_dict.get(client_id, "Desconocido")
-        total_hours = round(data["total_hours"], 2) 
-        
-        tasks = [{"Título": title, "Horas": round(hours, 2)} 
-                 for title, hours in data["tasks"].items()]
-        
-        report_data.append({
-            "Cliente": client_name,
-            "Total Horas": total_hours,
-            "Tareas": tasks
-        })
-
-    return report_data
+
+    return ORJSONResponse(render_json(report))
+
+
+async def hours_report_file(report: HoursReport, title: str, filename: str, key: str,
+                            request: Union[ReportRequest, ClientReportRequest], file_format: str, generation: int):
+    """ render the report as a download, caching the file """
+
+    if file_format == "csv":
+        content = b"".join(render_csv(render_rows(report)))
+        await report_cache.set(key, content, request.start_date, request.end_date, report.client_ids, generation)
+        return Response(content, media_type=CSV_MEDIA_TYPE, headers={"Content-Disposition": f"attachment; filename={filename}.csv"})
+
+    return StreamingResponse(
+        report_cache.stream_into(
+            key,
+            stream_workbook(write_hours_report, title, render_rows(report)),
+            request.start_date, request.end_date, report.client_ids, generation
+        ),
+        media_type=XLSX_MEDIA_TYPE,
+        headers={"Content-Disposition": f"attachment; filename={filename}.xlsx"}
+    )
+
+
+def cached_file(content: bytes, filename: str, file_format: str) -> Response:
+    media_type = CSV_MEDIA_TYPE if file_format == "csv" else XLSX_MEDIA_TYPE
+    return Response(content, media_type=media_type, headers={"Content-Disposition": f"attachment; filename={filename}.{file_format}"})
+
 
 @router.post("/download_report")
 async def download_report(
     request: ReportRequest,
+    file_format: str = Query("xlsx", alias="format", pattern="^(xlsx|csv)$"),
     user: dict = Depends(role_required(["socio", "senior", "consultor"]))
 ):
     """donwload the report of clients"""
-    
-    report_data = await get_hours_by_client(request, user)
-    
-   
-    excel_data = []
-    for entry in report_data:
-        client_name = entry["Cliente"]
-        total_hours = entry["Total Horas"]
-        
-        if not entry["Tareas"]:
-            excel_data.append({
-                "Cliente": client_name,
-                "Total Horas": total_hours,
-                "Tarea": "",
-                "Horas por Tarea": ""
-            })
-            continue
-        
-        for idx, task in enumerate(entry["Tareas"]):
-            excel_data.append({
-                "Cliente": client_name if idx == 0 else "",
-                "Total Horas": total_hours if idx == 0 else "",
-                "Tarea": task.get("Título", ""),
-                "Horas por Tarea": task.get("Horas", "")
-            })
-
-    df = pd.DataFrame(excel_data)
-
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
-        df.to_excel(writer, sheet_name="Reporte", index=False, startrow=1)
-        workbook = writer.book
-        worksheet = writer.sheets["Reporte"]
-
-        header_format = workbook.add_format({
-            'bold': True,
-            'text_wrap': True,
-            'valign': 'vcenter',
-            'align': 'center',
-            'fg_color': '#D7E4BC',
-            'border': 1
-        })
-
-        cell_format = workbook.add_format({
-            'border': 1,
-            'align': 'center',
-            'valign': 'vcenter'
-        })
-
-        for col_num, value in enumerate(df.columns.values):
-            worksheet.write(1, col_num, value, header_format)
-            worksheet.set_column(col_num, col_num, 15)
-
-        
-        worksheet.set_column('A:A', 30)  
-        worksheet.set_column('C:C', 30)  
-
-        title_format = workbook.add_format({
-            'bold': True,
-            'font_size': 14,
-            'align': 'center',
-            'valign': 'vcenter'
-        })
-        worksheet.merge_range('A1:D1', 'Reporte de Horas por Cliente', title_format)
-
-        for row in range(len(df)):
-            for col in range(len(df.columns)):
-                value = df.iloc[row, col]
-                worksheet.write(row + 2, col, value, cell_format)
-
-    output.seek(0)
-    return StreamingResponse(
-        output,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f"attachment; filename=reporte_horas_{request.start_date.date()}_{request.end_date.date()}.xlsx"}
-    )
+
+    filename = f"reporte_horas_{request.start_date.date()}_{request.end_date.date()}"
+    key = report_cache.key("download_report", request.start_date, request.end_date, kind=file_format)
+
+    content = await report_cache.get(key)
+    if content is not None:
+        return cached_file(content, filename, file_format)
+
+    generation = report_cache.generation
+    report = await get_cached_hours_report(request.start_date, request.end_date)
+
+    if not report.clients:
+        raise HTTPException(status_code=404, detail="No hay datos en el rango de fechas seleccionado")
+
+    return await hours_report_file(report, 'Reporte de Horas por Cliente', filename, key, request, file_format, generation)
 
 @router.post("/download_client_report")
 async def download_client_report(
     request: ClientReportRequest,
+    file_format: str = Query("xlsx", alias="format", pattern="^(xlsx|csv)$"),
     user: dict = Depends(role_required(["socio", "senior", "consultor"]))
 ):
     """ Donwload the report of a sepecific client """
 
-   
-    client_response = supabase.table("clients") \
+    client_response = await supabase.table("clients") \
         .select("id, name") \
         .eq("id", request.client_id) \
         .execute()
@@ -191,171 +103,160 @@ async def download_client_report(
         raise HTTPException(status_code=404, detail="Cliente no encontrado")
     client_name = client_response.data[0]["name"]
 
-   
-    time_response = supabase.table("time_entries") \
-        .select("task_id, duration, start_time, end_time") \
-        .gte("start_time", request.start_date.isoformat()) \
-        .lte("end_time", request.end_date.isoformat()) \
-        .execute()
+    filename = f"reporte_cliente_{client_name}_{request.start_date.date()}_{request.end_date.date()}"
+    key = report_cache.key("download_client_report", request.start_date, request.end_date, request.client_id, kind=file_format)
+
+    content = await report_cache.get(key)
+    if content is not None:
+        return cached_file(content, filename, file_format)
 
-    if not time_response.data:
+    generation = report_cache.generation
+    report = await get_cached_hours_report(request.start_date, request.end_date, request.client_id)
+
+    if not report.clients:
         raise HTTPException(status_code=404, detail="No hay datos en el rango de fechas seleccionado")
 
-   
-    task_response = supabase.table("tasks") \
-        .select("id, client_id, title") \
-        .eq("client_id", request.client_id) \
-        .execute()
-    if not task_response.data:
-        raise HTTPException(status_code=404, detail="No hay tareas registradas para este cliente")
-    task_dict = {task["id"]: {"client_id": task["client_id"], "title": task["title"]} for task in task_response.data}
-
-   
-    client_hours_data = {"total_hours": 0, "tasks": {}}
-    for entry in time_response.data:
-        task_id = entry["task_id"]
-        if task_id not in task_dict:
-            continue
-        task_title = task_dict[task_id]["title"]
-        client_hours_data["total_hours"] += entry["duration"]
-        if task_title not in client_hours_data["tasks"]:
-            client_hours_data["tasks"][task_title] = 0
-        client_hours_data["tasks"][task_title] += entry["duration"]
-
-    
-    for task in task_response.data:
-        task_title = task["title"]
-        if task_title not in client_hours_data["tasks"]:
-            client_hours_data["tasks"][task_title] = 0
-
-    total_hours = round(client_hours_data["total_hours"], 2)
-    tasks_list = [{"Título": title, "Horas": round(hours, 2)} for title, hours in client_hours_data["tasks"].items()]
-
-   
-    report = [{
-        "Cliente": client_name,
-        "Total Horas": total_hours,
-        "Tareas": tasks_list
-    }]
-
-    
-    excel_data = []
-    for entry in report:
-        cname = entry["Cliente"]
-        total = entry["Total Horas"]
-        if not entry["Tareas"]:
-            excel_data.append({
-                "Cliente": cname,
-                "Total Horas": total,
-                "Tarea": "",
-                "Horas por Tarea": ""
-            })
-            continue
-
-        for idx, task in enumerate(entry["Tareas"]):
-            excel_data.append({
-                "Cliente": cname if idx == 0 else "",
-                "Total Horas": total if idx == 0 else "",
-                "Tarea": task.get("Título", ""),
-                "Horas por Tarea": task.get("Horas", "")
-            })
-
-    df = pd.DataFrame(excel_data)
-    output = io.BytesIO()
-
-    with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
-        df.to_excel(writer, sheet_name="Reporte", index=False, startrow=1)
-        workbook = writer.book
-        worksheet = writer.sheets["Reporte"]
-
-        header_format = workbook.add_format({
-            'bold': True,
-            'text_wrap': True,
-            'valign': 'vcenter',
-            'align': 'center',
-            'fg_color': '#D7E4BC',
-            'border': 1
-        })
-
-        cell_format = workbook.add_format({
-            'border': 1,
-            'align': 'center',
-            'valign': 'vcenter'
-        })
-
-        for col_num, value in enumerate(df.columns.values):
-            worksheet.write(1, col_num, value, header_format)
-            worksheet.set_column(col_num, col_num, 15)
-
-        
-        worksheet.set_column('A:A', 30) 
-        worksheet.set_column('C:C', 30)  
-
-        title_format = workbook.add_format({
-            'bold': True,
-            'font_size': 14,
-            'align': 'center',
-            'valign': 'vcenter'
-        })
-        worksheet.merge_range('A1:D1', f'Reporte de Horas para {client_name}', title_format)
-
-        for row in range(len(df)):
-            for col in range(len(df.columns)):
-                value = df.iloc[row, col]
-                worksheet.write(row + 2, col, value, cell_format)
-
-    output.seek(0)
-    return StreamingResponse(
-        output,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f"attachment; filename=reporte_cliente_{client_name}_{request.start_date.date()}_{request.end_date.date()}.xlsx"}
-    )
+    return await hours_report_file(report, f'Reporte de Horas para {client_name}', filename, key, request, file_format, generation)
 
 
-@router.post("/get_time_entries")
-async def get_time_entries(data: ClientReportRequestTimeEntries, user: dict = Depends(role_required(["socio", "senior", "consultor"]))):
-    """ get the time entries by client """
+ENTRY_EXPORT_COLUMNS = [
+    ("id", "int64"), ("task_id", "int64"), ("user_id", "int64"),
+    ("start_time", "timestamp"), ("end_time", "timestamp"), ("duration", "float64")
+]
+
+HOURS_EXPORT_COLUMNS = [("client_id", "int64"), ("client", "string"), ("task", "string"), ("hours", "float64")]
+
+
+async def export_file(request: ExportRequest, file_format: str, job: Optional[ReportJob] = None, executor=None):
+    """ the chunks, media type and file name of an export, tracking the rows written on the job if any """
+
+    if request.dataset == "time_entries":
+        columns = ENTRY_EXPORT_COLUMNS
+
+        if job is not None:
+            job.rows_total = await count_time_entries(request.client_id, request.start_date, request.end_date)
+
+        def to_rows(entries):
+            return [tuple(entry[name] for name, kind in columns) for entry in entries]
+
+        async def pages():
+            loop = asyncio.get_running_loop()
+            async for entries in iter_time_entries(EXPORT_PAGE_SIZE, request.client_id, request.start_date, request.end_date):
+                if job is not None:
+                    job.rows_done += len(entries)
+                # shaped off the event loop, like the encoding of every format
+                yield await loop.run_in_executor(executor, to_rows, entries)
+
+    else:
+        columns = HOURS_EXPORT_COLUMNS
+        report = await get_cached_hours_report(request.start_date, request.end_date, request.client_id)
+
+        async def pages():
+            yield render_flat_rows(report)
+
+    names = [name for name, kind in columns]
+    filename = f"{request.dataset}_{request.start_date.date()}_{request.end_date.date()}.{file_format}"
+
+    if file_format == "csv":
+        return stream_csv(names, pages(), executor=executor), CSV_MEDIA_TYPE, filename
+
+    if file_format == "parquet":
+        return stream_parquet(columns, pages(), executor=executor), PARQUET_MEDIA_TYPE, filename
+
+    rows = rows_from_pages(pages(), asyncio.get_running_loop())
+    return stream_workbook(write_table, request.dataset, names, rows), XLSX_MEDIA_TYPE, filename
+
+
+@router.post("/export")
+async def export_report(
+    request: ExportRequest,
+    file_format: str = Query("csv", alias="format", pattern="^(csv|parquet|xlsx)$"),
+    user: dict = Depends(role_required(["socio", "senior", "consultor"]))
+):
+    """ export the raw time entries or the hours by client, streamed page by page """
+
+    body, media_type, filename = await export_file(request, file_format)
+
+    return StreamingResponse(body, media_type=media_type, headers={"Content-Disposition": f"attachment; filename={filename}"})
+
+
+def job_status(job: ReportJob) -> dict:
+    return {
+        "id": job.id,
+        "status": job.status,
+        "progress": job.progress,
+        "rows_done": job.rows_done,
+        "rows_total": job.rows_total,
+        "size": job.size,
+        "error": job.error,
+        "created_at": datetime.fromtimestamp(job.created_at),
+        "finished_at": datetime.fromtimestamp(job.finished_at) if job.finished_at else None,
+        "download_url": f"{router.prefix}/jobs/{job.id}/download" if job.status == DONE else None,
+        **job.description
+    }
+
+
+def owned_job(job_id: str, user: dict) -> ReportJob:
+    job = report_jobs.get(job_id)
+
+    if job is None or (job.owner_id != user["id"] and user["role"] != "socio"):
+        raise HTTPException(status_code=404, detail="Reporte no encontrado")
+
+    return job
+
+
+@router.post("/jobs", status_code=202)
+async def create_report_job(
+    request: ExportRequest,
+    file_format: str = Query("xlsx", alias="format", pattern="^(csv|parquet|xlsx)$"),
+    user: dict = Depends(role_required(["socio", "senior", "consultor"]))
+):
+    """ enqueue an export to be generated in the background, poll it with GET /reports/jobs/{id} """
+
+    async def render(job: ReportJob, executor):
+        return await export_file(request, file_format, job, executor)
+
+    description = {"dataset": request.dataset, "format": file_format, "start_date": request.start_date,
+                   "end_date": request.end_date, "client_id": request.client_id}
 
     try:
-        start_date = data.start_date.strftime("%Y-%m-%d")
-        end_date = data.end_date.strftime("%Y-%m-%d")
+        job = report_jobs.submit(user["id"], description, render)
+    except ReportJobQueueFull:
+        raise HTTPException(status_code=503, detail="Hay demasiados reportes en cola, intenta más tarde")
 
-        response = (
-            supabase.table("time_entries")
-            .select("start_time, end_time, task_id, tasks(client_id, clients(name))")
-            .gte("start_time", start_date)
-            .lte("start_time", end_date)
-            .execute()
-        )
+    return job_status(job)
 
-        if not response.data:
-            return []
 
-        time_entries_by_date = {}
+@router.get("/jobs/{job_id}")
+async def get_report_job(job_id: str, user: dict = Depends(role_required(["socio", "senior", "consultor"]))):
+    """ status and progress of a background report """
 
-        for entry in response.data:
-            start_time = parse_datetime(entry["start_time"])
-            end_time = parse_datetime(entry["end_time"])
-            duration_hours = (end_time - start_time).total_seconds() / 3600
+    return job_status(owned_job(job_id, user))
 
-            date_key = start_time.strftime("%Y-%m-%d")
-            client_name = entry["tasks"]["clients"]["name"]
 
-            if date_key not in time_entries_by_date:
-                time_entries_by_date[date_key] = {}
+@router.get("/jobs/{job_id}/download")
+async def download_report_job(job_id: str, user: dict = Depends(role_required(["socio", "senior", "consultor"]))):
+    """ download the file of a finished background report """
 
-            if client_name not in time_entries_by_date[date_key]:
-                time_entries_by_date[date_key][client_name] = 0
+    job = owned_job(job_id, user)
 
-            time_entries_by_date[date_key][client_name] += duration_hours
+    if job.status != DONE:
+        raise HTTPException(status_code=409, detail="El reporte aún no está listo")
+
+    return FileResponse(job.path, media_type=job.media_type, filename=job.filename)
+
+
+@router.post("/get_time_entries")
+async def get_time_entries(data: ClientReportRequestTimeEntries, user: dict = Depends(role_required(["socio", "senior", "consultor"]))):
+    """ get the time entries by client """
+
+    try:
+        if ROLLUP_ENABLED:
+            return ORJSONResponse(await get_daily_client_hours(data.start_date, data.end_date))
 
-        result = [
-            {"date": date, "client": client, "hours": hours}
-            for date, clients in time_entries_by_date.items()
-            for client, hours in clients.items()
-        ]
+        entries = await get_time_entries_with_clients(data.start_date, data.end_date)
 
-        return result
+        return ORJSONResponse(hours_by_date_and_client(entries))
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener los registros de tiempo: {str(e)}")
\ No newline at end of file
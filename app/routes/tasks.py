@@ -1,9 +1,12 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List
+from datetime import datetime
+from fastapi import APIRouter, HTTPException, Depends, Response
+from typing import List, Optional
 from fastapi.security import OAuth2PasswordBearer
 from app.models.ModelTasks import create_task, delete_task, get_all_tasks, get_tasks_by_user_id, update_task
 from app.schemas.schemas import TaskCreate, TaskResponse, TaskUpdate
-from app.services.utils import get_current_user, payload, role_required
+from app.services.pagination import PageParams, set_next_cursor
+from app.services.utils import get_current_user, role_required
+from app.services.versions import listing_etag
 
 
 router = APIRouter(prefix="/tasks", tags=["tasks"])
@@ -13,64 +16,82 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/users/login")
 
 
 @router.post("/create", response_model=TaskResponse, dependencies=[Depends(role_required(["socio", "senior", "consultor"]))])
-async def create_task_endpoint(task_data: TaskCreate,  token: str = Depends(oauth2_scheme)):
+async def create_task_endpoint(task_data: TaskCreate,  user_data: dict = Depends(get_current_user)):
 
     """ creates a new task """
 
-    user_data = payload(token)
         
 
     if not user_data or "id" not in user_data:
         raise HTTPException(status_code=401, detail="Usuario no autenticado")
 
-    task = create_task(task_data)
+    task = await create_task(task_data)
     if "error" in task:
         raise HTTPException(status_code=400, detail=task["error"])
     return task
 
 
 @router.get("/get_task")
-async def get_tasks_endpoint( token: str = Depends(oauth2_scheme)):
+async def get_tasks_endpoint(
+    response: Response,
+    page: PageParams = Depends(),
+    client_id: Optional[int] = None,
+    assigned_to_id: Optional[int] = None,
+    due_from: Optional[datetime] = None,
+    due_to: Optional[datetime] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    user_data: dict = Depends(get_current_user),
+    etag: str = Depends(listing_etag("tasks", "clients", "time_entries"))
+):
+
+    """ get a page of tasks with the hours logged between start_date and end_date (all time when omitted), the next page cursor is sent in the X-Next-Cursor header """
 
-    """ get all the tasks """
-
-    user_data = payload(token)
         
 
     if not user_data or "id" not in user_data:
         raise HTTPException(status_code=401, detail="Usuario no autenticado")
 
 
-    return get_all_tasks()
+    tasks, next_cursor = await get_all_tasks(
+        page.limit, page.cursor, client_id, assigned_to_id, due_from, due_to, start_date, end_date
+    )
+
+    set_next_cursor(response, next_cursor)
+
+    return tasks
 
 
 @router.get("/get_tasks_by_user")
-async def get_task_endpoint(token: str = Depends(oauth2_scheme)):
+async def get_task_endpoint(
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    user_data: dict = Depends(get_current_user),
+    etag: str = Depends(listing_etag("tasks", "time_entries", per_user=True))
+):
 
-    """ get a task by the user id """
+    """ get the tasks of the user with the hours logged between start_date and end_date (all time when omitted) """
 
-    user_data = payload(token)
     
     if not user_data or "id" not in user_data:
 
         raise HTTPException(status_code=401, detail="Usuario no autenticado")
     
-    return get_tasks_by_user_id(user_data["id"])
+    return await get_tasks_by_user_id(user_data["id"], start_date, end_date)
 
 
 @router.put("/{task_id}")
-async def update_task_endpoint(task_id: int, task_data: TaskUpdate, user : dict = Depends(role_required(["socio", "senior", "consultor"])), token: str = Depends(oauth2_scheme)):
+async def update_task_endpoint(task_id: int, task_data: TaskUpdate, user : dict = Depends(role_required(["socio", "senior", "consultor"])), user_data: dict = Depends(get_current_user)):
 
     """  update a tasks """
 
-    user_data = payload(token)
         
 
     if not user_data or "id" not in user_data:
         raise HTTPException(status_code=401, detail="Usuario no autenticado")
 
 
-    task = update_task(task_id, task_data)
+    task = await update_task(task_id, task_data)
 
     if "error" in task:
 
@@ -80,18 +101,17 @@ async def update_task_endpoint(task_id: int, task_data: TaskUpdate, user : dict
 
 
 @router.delete("/delete/{task_id}", dependencies=[Depends(role_required(["socio", "senior"]))])
-async def delete_task_endpoint(task_id: int, token: str = Depends(oauth2_scheme)):
+async def delete_task_endpoint(task_id: int, user_data: dict = Depends(get_current_user)):
 
     """ delete a task """
 
-    user_data = payload(token)
         
 
     if not user_data or "id" not in user_data:
         raise HTTPException(status_code=401, detail="Usuario no autenticado")
 
 
-    result = delete_task(task_id)
+    result = await delete_task(task_id)
 
     if "error" in result:
 
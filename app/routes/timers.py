@@ -0,0 +1,81 @@
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from app.models.ModelTasks import task_exists
+from app.schemas.schemas import TimeEntryResponse, TimerResponse, TimerStart
+from app.services.timers import TimerError, running_timers
+from app.services.utils import get_current_user
+
+
+router = APIRouter(prefix="/timers", tags=["timers"])
+
+
+@router.post("/start", response_model=TimerResponse)
+async def start_timer_endpoint(timer_data: TimerStart, user: dict = Depends(get_current_user)):
+
+    """ start a timer on a task, the time is saved at checkpoints and when it stops """
+
+    if not await task_exists(timer_data.task_id):
+
+        raise HTTPException(status_code=404, detail="Tarea no encontrada")
+
+    try:
+        timer = running_timers.start_timer(user["id"], timer_data.task_id)
+    except TimerError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    return timer.to_dict()
+
+
+@router.post("/heartbeat", response_model=TimerResponse)
+async def heartbeat_endpoint(user: dict = Depends(get_current_user)):
+
+    """ keep the running timer alive, timers without heartbeats are stopped at the last one """
+
+    try:
+        timer = running_timers.heartbeat(user["id"])
+    except TimerError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    return timer.to_dict()
+
+
+@router.post("/stop", response_model=TimeEntryResponse)
+async def stop_timer_endpoint(user: dict = Depends(get_current_user)):
+
+    """ stop the running timer and return its time entry """
+
+    if running_timers.get(user["id"]) is None:
+
+        raise HTTPException(status_code=404, detail="No tienes un temporizador en curso.")
+
+    try:
+        entry = await running_timers.stop_timer(user["id"])
+    except TimerError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    if entry is None:
+
+        raise HTTPException(status_code=400, detail="El temporizador se detuvo sin tiempo registrado.")
+
+    return entry
+
+
+@router.get("/running", response_model=List[TimerResponse])
+async def running_timers_endpoint(user: dict = Depends(get_current_user)):
+
+    """ the timers running now """
+
+    return running_timers.running()
+
+
+@router.get("/stream")
+async def timers_stream_endpoint(user: dict = Depends(get_current_user)):
+
+    """ server-sent events with the running timers and their changes: snapshot, started, checkpoint and stopped """
+
+    return StreamingResponse(
+        running_timers.subscribe(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 
@@ -53,8 +53,8 @@ class TimeEntryCreate(BaseModel):
 
 
 class TimeEntryUpdate(BaseModel):
-    start_time: Optional[datetime] 
-    end_time: Optional[datetime] 
+    start_time: Optional[datetime] = None
+    end_time: Optional[datetime] = None
 
 
 class TimeEntryResponse(BaseModel):
@@ -66,6 +66,29 @@ class TimeEntryResponse(BaseModel):
     duration: float
 
 
+class TimeEntryBulkCreate(BaseModel):
+    entries: List[TimeEntryCreate] = Field(..., min_length=1, max_length=1000)
+
+
+class TimeEntryBulkResult(BaseModel):
+    index: int
+    status: str
+    entry: Optional[TimeEntryResponse] = None
+    error: Optional[str] = None
+
+
+class TimerStart(BaseModel):
+    task_id: int
+
+
+class TimerResponse(BaseModel):
+    user_id: int
+    task_id: int
+    started_at: datetime
+    last_heartbeat: datetime
+    entry_id: Optional[int] = None
+
+
 class ReportRequest(BaseModel):
     start_date: datetime
     end_date: datetime
@@ -80,4 +103,11 @@ class ClientReportRequest(BaseModel):
 
 class ClientReportRequestTimeEntries(BaseModel):
     start_date: datetime
-    end_date: datetime
\ No newline at end of file
+    end_date: datetime
+
+
+class ExportRequest(BaseModel):
+    start_date: datetime
+    end_date: datetime
+    dataset: str = Field("time_entries", pattern="^(time_entries|hours_by_client)$")
+    client_id: Optional[int] = None
@@ -0,0 +1,56 @@
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """ bounded in-process cache with LRU eviction and a time to live per entry """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+
+
+    def get(self, key, default=None):
+        """ return the cached value or default when it is missing or expired """
+        item = self._data.get(key)
+        if item is None:
+            return default
+
+        expires_at, value = item
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return default
+
+        self._data.move_to_end(key)
+        return value
+
+
+    def set(self, key, value):
+        """ store a value, evicting the least recently used entries when full """
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+
+    def pop(self, key, default=None):
+        """ remove a key and return its value """
+        item = self._data.pop(key, None)
+        return item[1] if item else default
+
+
+    def items(self):
+        """ the entries that have not expired, least recently used first """
+        now = time.monotonic()
+        return [(key, value) for key, (expires_at, value) in self._data.items() if expires_at > now]
+
+
+    def clear(self):
+        """ remove every entry """
+        self._data.clear()
+
+
+    def __len__(self):
+        return len(self._data)
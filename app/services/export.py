@@ -0,0 +1,278 @@
+import asyncio
+import csv
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Iterable, Iterator, List, Tuple
+
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+CSV_MEDIA_TYPE = "text/csv; charset=utf-8"
+PARQUET_MEDIA_TYPE = "application/vnd.apache.parquet"
+
+CHUNK_SIZE = 64 * 1024
+
+# rows per datastore page while exporting, each page becomes one parquet row group
+EXPORT_PAGE_SIZE = int(os.getenv("EXPORT_PAGE_SIZE", "1000"))
+
+# the workbook writers block on the event loop for their rows and for the reader of
+# their chunks, they get a pool of their own so they never wait on work queued behind them
+EXPORT_WORKBOOK_THREADS = int(os.getenv("EXPORT_WORKBOOK_THREADS", "4"))
+
+workbook_executor = ThreadPoolExecutor(max_workers=EXPORT_WORKBOOK_THREADS, thread_name_prefix="workbook")
+
+HOURS_REPORT_COLUMNS = ["Cliente", "Total Horas", "Tarea", "Horas por Tarea"]
+
+
+def constant_memory_workbook(output):
+    # xlsxwriter is only needed by the workbook exports, keep it out of the startup path
+    import xlsxwriter
+
+    return xlsxwriter.Workbook(output, {"constant_memory": True})
+
+
+def write_hours_report(output, title: str, rows: Iterable[tuple]):
+    """ write the hours report workbook row by row in constant memory """
+
+    workbook = constant_memory_workbook(output)
+    worksheet = workbook.add_worksheet("Reporte")
+
+    header_format = workbook.add_format({
+        'bold': True,
+        'text_wrap': True,
+        'valign': 'vcenter',
+        'align': 'center',
+        'fg_color': '#D7E4BC',
+        'border': 1
+    })
+
+    cell_format = workbook.add_format({
+        'border': 1,
+        'align': 'center',
+        'valign': 'vcenter'
+    })
+
+    title_format = workbook.add_format({
+        'bold': True,
+        'font_size': 14,
+        'align': 'center',
+        'valign': 'vcenter'
+    })
+
+    worksheet.set_column(0, len(HOURS_REPORT_COLUMNS) - 1, 15)
+    worksheet.set_column('A:A', 30)
+    worksheet.set_column('C:C', 30)
+
+    worksheet.merge_range('A1:D1', title, title_format)
+
+    for col_num, value in enumerate(HOURS_REPORT_COLUMNS):
+        worksheet.write(1, col_num, value, header_format)
+
+    for row_num, row in enumerate(rows, start=2):
+        for col_num, value in enumerate(row):
+            worksheet.write(row_num, col_num, value, cell_format)
+
+    workbook.close()
+
+
+def write_table(output, title: str, columns: List[str], rows: Iterable[tuple]):
+    """ write a plain table workbook row by row in constant memory """
+
+    workbook = constant_memory_workbook(output)
+    worksheet = workbook.add_worksheet(title[:31])
+    header_format = workbook.add_format({'bold': True, 'fg_color': '#D7E4BC', 'border': 1})
+
+    worksheet.set_column(0, len(columns) - 1, 20)
+
+    for col_num, value in enumerate(columns):
+        worksheet.write(0, col_num, value, header_format)
+
+    for row_num, row in enumerate(rows, start=1):
+        for col_num, value in enumerate(row):
+            worksheet.write(row_num, col_num, value)
+
+    workbook.close()
+
+
+def rows_from_pages(pages: AsyncIterator[List[tuple]], loop: asyncio.AbstractEventLoop) -> Iterator[tuple]:
+    """ iterate from a worker thread over the rows of pages fetched on the event loop """
+
+    while True:
+        try:
+            page = asyncio.run_coroutine_threadsafe(pages.__anext__(), loop).result()
+        except StopAsyncIteration:
+            return
+        yield from page
+
+
+async def stream_csv(columns: List[str], pages: AsyncIterator[List[tuple]], executor=None) -> AsyncIterator[bytes]:
+    """ encode the rows as CSV as their pages arrive, one chunk per page, encoded in the executor """
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+
+    def encode_page(page):
+        writer.writerows(page)
+        chunk = buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+        return chunk
+
+    loop = asyncio.get_running_loop()
+
+    async for page in pages:
+        yield await loop.run_in_executor(executor, encode_page, page)
+
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+class _ParquetSink(io.RawIOBase):
+    """ output stream that keeps what the parquet writer produced until it is drained """
+
+    def __init__(self):
+        super().__init__()
+        self._buffer = bytearray()
+        self._position = 0
+
+
+    def writable(self) -> bool:
+        return True
+
+
+    def write(self, data) -> int:
+        self._buffer += data
+        self._position += len(data)
+        return len(data)
+
+
+    def tell(self) -> int:
+        return self._position
+
+
+    def drain(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+async def stream_parquet(columns: List[Tuple[str, str]], pages: AsyncIterator[List[tuple]], executor=None) -> AsyncIterator[bytes]:
+    """ write each page as a parquet row group and yield the bytes as they are produced
+
+    columns are (name, type) pairs with type one of int64, float64, string
+    or timestamp.
+    """
+
+    # pyarrow is only needed by this export, keep it out of the startup path
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    types = {"int64": pa.int64(), "float64": pa.float64(), "string": pa.string(), "timestamp": pa.timestamp("us")}
+    schema = pa.schema([(name, types[kind]) for name, kind in columns])
+
+    def to_array(values, kind):
+        if kind == "timestamp":
+            return pa.array(values, pa.string()).cast(types[kind])
+        return pa.array(values, types[kind])
+
+    def write_page(page):
+        values = list(zip(*page))
+        writer.write_batch(pa.record_batch(
+            [to_array(values[index], kind) for index, (name, kind) in enumerate(columns)],
+            schema=schema
+        ))
+        return sink.drain()
+
+    loop = asyncio.get_running_loop()
+    sink = _ParquetSink()
+    writer = pq.ParquetWriter(sink, schema)
+
+    try:
+        async for page in pages:
+            if page:
+                yield await loop.run_in_executor(executor, write_page, page)
+    finally:
+        writer.close()
+
+    yield sink.drain()
+
+
+class _ChunkPipe:
+    """ write-only file object that hands the bytes to an async consumer in chunks """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, queue: asyncio.Queue):
+        self._loop = loop
+        self._queue = queue
+        self._buffer = bytearray()
+        self._aborted = False
+        self.cancelled = False
+
+
+    def _put(self, item):
+        asyncio.run_coroutine_threadsafe(self._queue.put(item), self._loop).result()
+
+
+    def write(self, data) -> int:
+        if self.cancelled:
+            # abort the writer once, then discard whatever it flushes while unwinding
+            if not self._aborted:
+                self._aborted = True
+                raise ConnectionAbortedError("El cliente cerró la descarga")
+            return len(data)
+
+        self._buffer += data
+        if len(self._buffer) >= CHUNK_SIZE:
+            self.flush()
+        return len(data)
+
+
+    def flush(self):
+        if self._buffer:
+            self._put(bytes(self._buffer))
+            self._buffer.clear()
+
+
+    def close(self):
+        try:
+            if not self.cancelled:
+                self.flush()
+        finally:
+            self._put(None)
+
+
+async def stream_workbook(writer, *args):
+    """ run a workbook writer in a thread of workbook_executor and yield the file as it is zipped
+
+    The rows may come from rows_from_pages, whose pages are shaped in
+    another executor, so the writer threads only ever wait on work that
+    other threads do.
+    """
+
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=4)
+    pipe = _ChunkPipe(loop, queue)
+
+    def produce():
+        try:
+            writer(pipe, *args)
+        finally:
+            pipe.close()
+
+    task = loop.run_in_executor(workbook_executor, produce)
+
+    try:
+        while True:
+            chunk = await queue.get()
+            if chunk is None:
+                break
+            yield chunk
+
+        await task
+
+    finally:
+        if not task.done():
+            pipe.cancelled = True
+            task.add_done_callback(lambda future: future.exception())
+            while not queue.empty():
+                queue.get_nowait()
@@ -0,0 +1,109 @@
+import csv
+import io
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, List, Optional
+
+from app.services.export import CHUNK_SIZE, HOURS_REPORT_COLUMNS
+
+
+@dataclass
+class TaskHours:
+    title: str
+    hours: float
+
+
+@dataclass
+class ClientHours:
+    client_id: Optional[int]
+    name: str
+    total_hours: float = 0
+    tasks: List[TaskHours] = field(default_factory=list)
+
+
+@dataclass
+class HoursReport:
+    """ hours per client and per task, the aggregate every hours report renders """
+
+    clients: List[ClientHours] = field(default_factory=list)
+
+    @property
+    def client_ids(self) -> List[int]:
+        return [client.client_id for client in self.clients if client.client_id is not None]
+
+
+def build_hours_report(rows: Iterable[dict]) -> HoursReport:
+    """ group the rows of the hours_by_client function per client """
+
+    clients = {}
+
+    for row in rows:
+        client = clients.get(row["client_id"])
+        if client is None:
+            client = clients[row["client_id"]] = ClientHours(row["client_id"], row["client_name"] or "Desconocido")
+
+        client.total_hours += row["hours"]
+        client.tasks.append(TaskHours(row["task_title"], row["hours"]))
+
+    return HoursReport(list(clients.values()))
+
+
+def render_json(report: HoursReport) -> List[dict]:
+    """ the report as returned by /reports/hours_by_client/ """
+
+    return [
+        {
+            "Cliente": client.name,
+            "Total Horas": round(client.total_hours, 2),
+            "Tareas": [{"Título": task.title, "Horas": round(task.hours, 2)} for task in client.tasks]
+        }
+        for client in report.clients
+    ]
+
+
+def render_rows(report: HoursReport) -> Iterator[tuple]:
+    """ flatten the report into spreadsheet rows, the client and total only on its first task """
+
+    for client in report.clients:
+        total_hours = round(client.total_hours, 2)
+
+        if not client.tasks:
+            yield (client.name, total_hours, "", "")
+            continue
+
+        for idx, task in enumerate(client.tasks):
+            yield (
+                client.name if idx == 0 else "",
+                total_hours if idx == 0 else "",
+                task.title,
+                round(task.hours, 2)
+            )
+
+
+def render_flat_rows(report: HoursReport) -> List[tuple]:
+    """ one (client id, client, task, hours) row per task, for exports """
+
+    return [
+        (client.client_id, client.name, task.title, task.hours)
+        for client in report.clients
+        for task in client.tasks
+    ]
+
+
+def render_csv(rows: Iterable[tuple], columns: List[str] = HOURS_REPORT_COLUMNS) -> Iterator[bytes]:
+    """ encode rows as CSV in chunks, with a byte order mark so spreadsheets read it as UTF-8 """
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    buffer.write("\ufeff")
+    writer.writerow(columns)
+
+    for row in rows:
+        writer.writerow(row)
+
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue().encode("utf-8")
@@ -0,0 +1,220 @@
+import asyncio
+import logging
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple
+
+
+REPORT_JOB_WORKERS = int(os.getenv("REPORT_JOB_WORKERS", "2"))
+REPORT_JOB_QUEUE_SIZE = int(os.getenv("REPORT_JOB_QUEUE_SIZE", "100"))
+REPORT_SPOOL_DIR = os.getenv("REPORT_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "timer-report-jobs"))
+REPORT_SPOOL_MAX_BYTES = int(os.getenv("REPORT_SPOOL_MAX_BYTES", str(1024 * 1024 * 1024)))
+REPORT_SPOOL_MAX_AGE = float(os.getenv("REPORT_SPOOL_MAX_AGE", str(24 * 3600)))
+REPORT_SPOOL_SWEEP_INTERVAL = float(os.getenv("REPORT_SPOOL_SWEEP_INTERVAL", "60"))
+
+PENDING = "pendiente"
+RUNNING = "en_proceso"
+DONE = "completado"
+FAILED = "error"
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ReportJob:
+    """ a report computed off the request path and kept in the spool until downloaded or evicted """
+
+    id: str
+    owner_id: int
+    description: dict
+    status: str = PENDING
+    rows_done: int = 0
+    rows_total: Optional[int] = None
+    size: int = 0
+    error: Optional[str] = None
+    path: Optional[str] = None
+    filename: Optional[str] = None
+    media_type: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+
+    @property
+    def progress(self) -> Optional[float]:
+        if self.status == DONE:
+            return 1.0
+        if not self.rows_total:
+            return None
+        return min(1.0, self.rows_done / self.rows_total)
+
+
+# builds the file of a job: returns the chunks, the media type and the file name,
+# and may update rows_done and rows_total of the job while the chunks are produced
+JobRenderer = Callable[[ReportJob, ThreadPoolExecutor], Awaitable[Tuple[AsyncIterator[bytes], str, str]]]
+
+
+class ReportJobQueueFull(Exception):
+    pass
+
+
+class ReportJobManager:
+    """ bounded queue of report jobs served by a fixed number of workers
+
+    The workers run on the event loop and fetch through the async
+    datastore; the CPU bound encoding runs in a dedicated thread pool, so
+    heavy reports never take the threads of the interactive endpoints.
+    """
+
+    def __init__(self, workers: int = REPORT_JOB_WORKERS, queue_size: int = REPORT_JOB_QUEUE_SIZE,
+                 spool_dir: str = REPORT_SPOOL_DIR, max_bytes: int = REPORT_SPOOL_MAX_BYTES,
+                 max_age: float = REPORT_SPOOL_MAX_AGE):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.spool_dir = spool_dir
+        # this process's own directory under spool_dir, created on start
+        self.directory: Optional[str] = None
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.jobs: Dict[str, ReportJob] = {}
+        self.queue: Optional[asyncio.Queue] = None
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.tasks = []
+
+
+    async def start(self):
+        # the jobs live in memory, so each process spools in a directory of its own and removes it on stop
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self.directory = tempfile.mkdtemp(prefix=f"{os.getpid()}-", dir=self.spool_dir)
+
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="report-job")
+        self.tasks = [asyncio.create_task(self.work()) for _ in range(self.workers)]
+        self.tasks.append(asyncio.create_task(self.sweep_periodically()))
+
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+        if self.directory is not None:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self.directory = None
+
+
+    def submit(self, owner_id: int, description: dict, render: JobRenderer) -> ReportJob:
+        """ enqueue a job, raise ReportJobQueueFull when the backlog is at its limit """
+        if self.queue is None:
+            raise RuntimeError("report jobs are not started")
+
+        job = ReportJob(uuid.uuid4().hex, owner_id, description)
+
+        try:
+            self.queue.put_nowait((job, render))
+        except asyncio.QueueFull:
+            raise ReportJobQueueFull()
+
+        self.jobs[job.id] = job
+        return job
+
+
+    def get(self, job_id: str) -> Optional[ReportJob]:
+        return self.jobs.get(job_id)
+
+
+    async def work(self):
+        while True:
+            job, render = await self.queue.get()
+            try:
+                await self.run(job, render)
+            finally:
+                self.queue.task_done()
+
+
+    async def run(self, job: ReportJob, render: JobRenderer):
+        loop = asyncio.get_running_loop()
+        job.status = RUNNING
+        path = os.path.join(self.directory, job.id)
+
+        try:
+            chunks, job.media_type, job.filename = await render(job, self.executor)
+
+            file = await loop.run_in_executor(self.executor, open, path, "wb")
+            try:
+                async for chunk in chunks:
+                    await loop.run_in_executor(self.executor, file.write, chunk)
+                    job.size += len(chunk)
+            finally:
+                await loop.run_in_executor(self.executor, file.close)
+
+            job.path = path
+            job.status = DONE
+
+        except asyncio.CancelledError:
+            self.remove_file(path)
+            raise
+
+        except Exception as e:
+            logger.exception("report job %s failed", job.id)
+            self.remove_file(path)
+            job.status = FAILED
+            job.error = str(e)
+
+        finally:
+            job.finished_at = time.time()
+
+        self.evict()
+
+
+    async def sweep_periodically(self):
+        while True:
+            await asyncio.sleep(REPORT_SPOOL_SWEEP_INTERVAL)
+            self.evict()
+
+
+    def evict(self):
+        """ forget finished jobs older than max_age, then the oldest ones while the spool is over max_bytes """
+        now = time.time()
+        finished = sorted(
+            (job for job in self.jobs.values() if job.finished_at is not None),
+            key=lambda job: job.finished_at
+        )
+
+        for job in finished:
+            if now - job.finished_at > self.max_age:
+                self.forget(job)
+
+        spooled = [job for job in finished if job.id in self.jobs and job.path]
+        total = sum(job.size for job in spooled)
+
+        for job in spooled:
+            if total <= self.max_bytes:
+                break
+            total -= job.size
+            self.forget(job)
+
+
+    def forget(self, job: ReportJob):
+        self.jobs.pop(job.id, None)
+        if job.path:
+            self.remove_file(job.path)
+
+
+    @staticmethod
+    def remove_file(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+report_jobs = ReportJobManager()
@@ -0,0 +1,185 @@
+import os
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Dict, Optional, Sequence, Tuple
+
+
+# off by default: when on, /metrics and the Server-Timing header show per-route traffic and latency
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "false").lower() == "true"
+# when set, /metrics requires "Authorization: Bearer <METRICS_TOKEN>", set it whenever metrics are on
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+
+
+class Histogram:
+    """ cumulative Prometheus histogram with one series per label set """
+
+    def __init__(self, name: str, help: str, labels: Sequence[str], buckets: Sequence[float]):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.series: Dict[tuple, list] = {}
+
+
+    def observe(self, value: float, *label_values):
+        series = self.series.get(label_values)
+        if series is None:
+            series = self.series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+
+        counts = series[0]
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[index] += 1
+        series[1] += value
+        series[2] += 1
+
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+
+        for label_values, (counts, total, count) in sorted(self.series.items()):
+            labels = format_labels(self.labels, label_values)
+            prefix = labels[:-1] + "," if labels else "{"
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{prefix}le="{bound:g}"}} {bucket_count}')
+            lines.append(f'{self.name}_bucket{prefix}le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{labels} {total:.6f}")
+            lines.append(f"{self.name}_count{labels} {count}")
+
+        return "\n".join(lines)
+
+
+class Counter:
+    """ monotonically increasing Prometheus counter with one series per label set """
+
+    def __init__(self, name: str, help: str, labels: Sequence[str]):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.series: Dict[tuple, float] = {}
+
+
+    def inc(self, amount: float, *label_values):
+        self.series[label_values] = self.series.get(label_values, 0) + amount
+
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for label_values, value in sorted(self.series.items()):
+            lines.append(f"{self.name}{format_labels(self.labels, label_values)} {value:g}")
+        return "\n".join(lines)
+
+
+def format_labels(names: Tuple[str, ...], values: tuple) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{escape_label(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+request_latency = Histogram(
+    "http_request_duration_seconds", "Time to the end of the response body, per route",
+    ("method", "route", "status"), LATENCY_BUCKETS
+)
+request_queries = Histogram(
+    "http_request_db_queries", "Datastore execute() calls made by one request, per route",
+    ("method", "route"), QUERY_COUNT_BUCKETS
+)
+query_latency = Histogram(
+    "db_query_duration_seconds", "Duration of the datastore execute() calls, per table or function",
+    ("target", "operation"), LATENCY_BUCKETS
+)
+query_rows = Counter(
+    "db_query_rows_total", "Rows returned by the datastore execute() calls, per table or function",
+    ("target", "operation")
+)
+query_errors = Counter(
+    "db_query_errors_total", "Datastore execute() calls that raised, per table or function",
+    ("target", "operation")
+)
+
+REGISTRY = (request_latency, request_queries, query_latency, query_rows, query_errors)
+
+
+@dataclass
+class RequestStats:
+    """ datastore work done while serving the current request """
+
+    queries: int = 0
+    query_seconds: float = 0.0
+    rows: int = 0
+
+
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+
+def record_query(target: str, operation: str, seconds: float, rows: int, failed: bool = False):
+    """ account one datastore round trip globally and on the request being served """
+    query_latency.observe(seconds, target, operation)
+    if failed:
+        query_errors.inc(1, target, operation)
+    else:
+        query_rows.inc(rows, target, operation)
+
+    stats = current_request.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.query_seconds += seconds
+        stats.rows += rows
+
+
+def render_metrics() -> str:
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+class MetricsMiddleware:
+    """ pure ASGI middleware timing every request and adding a Server-Timing header
+
+    The header is sent with the response head, so for streamed responses it
+    only covers the work done before the first byte; the histograms cover
+    the whole body.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = current_request.set(stats)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                elapsed = (time.perf_counter() - started) * 1000
+                timing = (
+                    f'db;dur={stats.query_seconds * 1000:.1f};desc="{stats.queries} queries, {stats.rows} rows", '
+                    f"app;dur={elapsed:.1f}"
+                )
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"server-timing", timing.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_request.reset(token)
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            request_latency.observe(time.perf_counter() - started, scope["method"], path, status)
+            request_queries.observe(stats.queries, scope["method"], path)
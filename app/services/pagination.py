@@ -0,0 +1,88 @@
+import base64
+import json
+import os
+from typing import Optional
+
+from fastapi import HTTPException, Query, Response
+
+
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", "200"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "1000"))
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(values: dict) -> str:
+    """ encode the keyset of the last row as an opaque token """
+    raw = json.dumps(values, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[dict]:
+    """ decode a token built by encode_cursor """
+    if not cursor:
+        return None
+
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, json.JSONDecodeError):
+        raise HTTPException(status_code=400, detail="Cursor de paginación inválido")
+
+    if not isinstance(values, dict):
+        raise HTTPException(status_code=400, detail="Cursor de paginación inválido")
+
+    return values
+
+
+def cursor_value(cursor: dict, key: str, cast):
+    """ read and validate one key of a decoded cursor """
+    try:
+        return cast(cursor[key])
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Cursor de paginación inválido")
+
+
+def keyset_page(rows: list, limit: int, keys: tuple):
+    """ drop the extra row fetched past the limit and build the cursor of the next page """
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+
+    return rows, encode_cursor({key: last[key] for key in keys})
+
+
+async def fetch_all(build_query, page_size: int = 1000) -> list:
+    """ read every row of an ordered query in pages, PostgREST caps the rows of a single response """
+    rows = []
+    start = 0
+
+    while True:
+        response = await build_query().range(start, start + page_size - 1).execute()
+        page = response.data or []
+        rows.extend(page)
+
+        if len(page) < page_size:
+            return rows
+
+        start += page_size
+
+
+class PageParams:
+    """ limit and cursor query parameters shared by the list endpoints """
+
+    def __init__(
+        self,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        cursor: Optional[str] = Query(None)
+    ):
+        self.limit = limit
+        self.cursor = decode_cursor(cursor)
+
+
+def set_next_cursor(response: Response, cursor: Optional[str]):
+    """ expose the cursor of the next page, if any, as a response header """
+    if cursor:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
@@ -0,0 +1,206 @@
+""" cache of the computed reports, invalidated by the writes that change them
+
+The invalidation only reaches the cache of the process that handled the
+write: with several workers, the others keep serving the report they
+cached until REPORT_CACHE_TTL expires. The default TTL of 30 seconds
+bounds that staleness, raise it only for a single worker, or set
+REPORT_CACHE_BACKEND=none to turn the cache off.
+"""
+
+import os
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import AsyncIterator, Dict, Iterable, Optional, Set
+
+from app.services.cache import TTLCache
+
+
+REPORT_CACHE_BACKEND = os.getenv("REPORT_CACHE_BACKEND", "memory")
+REPORT_CACHE_SIZE = int(os.getenv("REPORT_CACHE_SIZE", "256"))
+# also the longest a report stays stale on the workers that did not see the write
+REPORT_CACHE_TTL = float(os.getenv("REPORT_CACHE_TTL", "30"))
+REPORT_CACHE_MAX_BYTES = int(os.getenv("REPORT_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+
+
+class ReportCacheBackend(ABC):
+    """ storage of the report cache, the memory and null backends implement it
+
+    Every value is stored with a set of tags and invalidate drops all the
+    values carrying any of the given tags.
+    """
+
+    @abstractmethod
+    async def get(self, key: str):
+        pass
+
+    @abstractmethod
+    async def set(self, key: str, value, tags: Set[str]):
+        pass
+
+    @abstractmethod
+    async def invalidate(self, tags: Set[str]):
+        pass
+
+    @abstractmethod
+    async def clear(self):
+        pass
+
+
+class MemoryReportBackend(ReportCacheBackend):
+    """ in-process LRU with a tag index, the default backend """
+
+    def __init__(self, maxsize: int = REPORT_CACHE_SIZE, ttl: float = REPORT_CACHE_TTL):
+        self.maxsize = maxsize
+        self.values = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.tags: Dict[str, Set[str]] = defaultdict(set)
+        self.writes = 0
+
+
+    async def get(self, key: str):
+        item = self.values.get(key)
+        return item[1] if item else None
+
+
+    async def set(self, key: str, value, tags: Set[str]):
+        self.values.set(key, (tags, value))
+        for tag in tags:
+            self.tags[tag].add(key)
+
+        self.writes += 1
+        if self.writes % self.maxsize == 0:
+            self.prune()
+
+
+    def prune(self):
+        """ rebuild the tag index from the live entries, dropping evicted and expired keys """
+        self.tags = defaultdict(set)
+        for key, (tags, value) in self.values.items():
+            for tag in tags:
+                self.tags[tag].add(key)
+
+
+    async def invalidate(self, tags: Set[str]):
+        for tag in tags:
+            for key in self.tags.pop(tag, ()):
+                self.values.pop(key)
+
+
+    async def clear(self):
+        self.values.clear()
+        self.tags.clear()
+
+
+class NullReportBackend(ReportCacheBackend):
+    """ disables the cache """
+
+    async def get(self, key: str):
+        return None
+
+    async def set(self, key: str, value, tags: Set[str]):
+        pass
+
+    async def invalidate(self, tags: Set[str]):
+        pass
+
+    async def clear(self):
+        pass
+
+
+BACKENDS = {
+    "memory": MemoryReportBackend,
+    "none": NullReportBackend,
+}
+
+
+def days_between(start: datetime, end: datetime) -> Iterable[date]:
+    day = start.date()
+    while day <= end.date():
+        yield day
+        day += timedelta(days=1)
+
+
+def parse_timestamp(value) -> datetime:
+    return value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+
+
+class ReportCache:
+    """ report results keyed by endpoint, date range and client
+
+    A cached report is tagged with every day of its range and with the
+    clients it contains. A time entry write drops the reports covering
+    its days, a task or client write the reports containing that client.
+    Only in this process, see the module docstring.
+    """
+
+    def __init__(self, backend: ReportCacheBackend):
+        self.backend = backend
+        # bumped on every invalidation, so a report computed before a write is not stored after it
+        self.generation = 0
+
+
+    @staticmethod
+    def key(endpoint: str, start: datetime, end: datetime, client_id: Optional[int] = None, kind: str = "json") -> str:
+        return f"{endpoint}|{start.isoformat()}|{end.isoformat()}|{client_id if client_id is not None else '*'}|{kind}"
+
+
+    async def get(self, key: str):
+        return await self.backend.get(key)
+
+
+    async def set(self, key: str, value, start: datetime, end: datetime,
+                  clients: Iterable[int] = (), generation: Optional[int] = None):
+        """ store a report unless a write invalidated the cache since generation was read """
+        if generation is not None and generation != self.generation:
+            return
+
+        tags = {f"day:{day.isoformat()}" for day in days_between(start, end)}
+        tags.update(f"client:{client}" for client in clients if client is not None)
+
+        await self.backend.set(key, value, tags)
+
+
+    async def stream_into(self, key: str, chunks: AsyncIterator[bytes], start: datetime, end: datetime,
+                          clients: Iterable[int] = (), generation: Optional[int] = None):
+        """ pass a rendered file through and store it once fully sent, unless it is over REPORT_CACHE_MAX_BYTES """
+        parts, size = [], 0
+
+        async for chunk in chunks:
+            if parts is not None:
+                size += len(chunk)
+                if size <= REPORT_CACHE_MAX_BYTES:
+                    parts.append(chunk)
+                else:
+                    parts = None
+            yield chunk
+
+        if parts is not None:
+            await self.set(key, b"".join(parts), start, end, clients, generation)
+
+
+    async def invalidate_entries(self, entries: Iterable[dict]):
+        """ drop the reports covering the days of these time entries """
+        await self.invalidate({
+            f"day:{day.isoformat()}"
+            for entry in entries
+            for day in days_between(parse_timestamp(entry["start_time"]), parse_timestamp(entry["end_time"]))
+        })
+
+
+    async def invalidate_clients(self, client_ids: Iterable[int]):
+        """ drop the reports that contain these clients """
+        await self.invalidate({f"client:{client_id}" for client_id in client_ids if client_id is not None})
+
+
+    async def invalidate(self, tags: Set[str]):
+        if tags:
+            self.generation += 1
+            await self.backend.invalidate(tags)
+
+
+    async def clear(self):
+        self.generation += 1
+        await self.backend.clear()
+
+
+report_cache = ReportCache(BACKENDS[REPORT_CACHE_BACKEND]())
@@ -0,0 +1,169 @@
+import os
+import zlib
+from typing import Iterable, List, Optional, Tuple, Type
+
+from pydantic import BaseModel
+from starlette.datastructures import Headers, MutableHeaders
+
+
+RESPONSE_COMPRESSION = os.getenv("RESPONSE_COMPRESSION", "false").lower() == "true"
+# smaller bodies fit in a packet anyway, compressing them only costs CPU
+RESPONSE_COMPRESSION_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", "1024"))
+RESPONSE_GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", "5"))
+RESPONSE_BROTLI_QUALITY = int(os.getenv("RESPONSE_BROTLI_QUALITY", "4"))
+
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+# every event has to reach the browser as soon as it is sent
+UNBUFFERED_TYPES = ("text/event-stream",)
+
+
+def trusted_rows(rows: List[dict], model: Type[BaseModel]) -> List[dict]:
+    """ keep the fields of the response model, for rows already shaped by the model layer
+
+    Endpoints returning them in an ORJSONResponse skip the validation of
+    every row against response_model, which still documents the schema.
+    """
+    fields = tuple(model.model_fields)
+    return [{field: row.get(field) for field in fields} for row in rows]
+
+
+def load_encodings() -> Tuple[str, ...]:
+    """ content codings offered, best first, br only when the brotli wheel is installed """
+    try:
+        import brotli  # noqa: F401
+    except ImportError:
+        return ("gzip",)
+    return ("br", "gzip")
+
+
+def negotiate_encoding(accept_encoding: str, encodings: Iterable[str]) -> Optional[str]:
+    """ the coding of encodings with the highest q in Accept-Encoding, ties go to the first one """
+    weights = {}
+
+    for part in accept_encoding.split(","):
+        coding, _, params = part.partition(";")
+        weight = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[coding.strip().lower()] = weight
+
+    best, best_weight = None, 0.0
+    for encoding in encodings:
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+
+    return best
+
+
+def is_compressible(status: int, headers: Headers) -> bool:
+    if status < 200 or status in (204, 304):
+        return False
+    if "content-encoding" in headers or "content-range" in headers:
+        return False
+
+    content_type = headers.get("content-type", "").lower()
+    return content_type.startswith(COMPRESSIBLE_TYPES) and not content_type.startswith(UNBUFFERED_TYPES)
+
+
+class CompressionMiddleware:
+    """ pure ASGI middleware compressing responses with br or gzip, as negotiated from Accept-Encoding
+
+    Only JSON and text bodies of at least minimum_size bytes are compressed.
+    Server-sent events, bodies already encoded and partial content are
+    sent as they are. Streamed bodies are compressed chunk by chunk. A
+    strong ETag becomes weak on the compressed body, If-None-Match still
+    matches it.
+    """
+
+    def __init__(self, app, minimum_size: int = RESPONSE_COMPRESSION_MIN_BYTES,
+                 gzip_level: int = RESPONSE_GZIP_LEVEL, brotli_quality: int = RESPONSE_BROTLI_QUALITY):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.encodings = load_encodings()
+
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""), self.encodings)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        compress = finish = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, compress, finish, passthrough
+
+            if message["type"] == "http.response.start":
+                # held back until the first body chunk tells whether it is worth compressing
+                start = message
+                return
+
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if start is not None:
+                headers = MutableHeaders(raw=start["headers"])
+
+                if not is_compressible(start["status"], headers) or (not more_body and len(body) < self.minimum_size):
+                    passthrough = True
+                    await send(start)
+                    start = None
+                    await send(message)
+                    return
+
+                compress, finish = self.compressor(encoding)
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    headers["ETag"] = f"W/{etag}"
+
+                if more_body:
+                    del headers["Content-Length"]
+                else:
+                    body = compress(body) + finish()
+                    headers["Content-Length"] = str(len(body))
+                    await send(start)
+                    start = None
+                    await send({"type": "http.response.body", "body": body})
+                    return
+
+                await send(start)
+                start = None
+
+            body = compress(body)
+            if not more_body:
+                body += finish()
+            await send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
+
+
+    def compressor(self, encoding: str):
+        """ the compress and finish functions of a new stream """
+        if encoding == "br":
+            import brotli
+
+            stream = brotli.Compressor(quality=self.brotli_quality)
+            return stream.process, stream.finish
+
+        stream = zlib.compressobj(self.gzip_level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+        return stream.compress, stream.flush
@@ -0,0 +1,90 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from app.database.data import supabase
+
+
+REVOCATION_REFRESH_SECONDS = float(os.getenv("REVOCATION_REFRESH_SECONDS", "30"))
+
+logger = logging.getLogger(__name__)
+
+
+class RevocationList:
+    """ ids of the revoked tokens that have not expired yet, kept in memory
+
+    Checking a token is a set lookup. Revocations made by this worker are
+    visible at once, the ones made by other workers after the next refresh.
+    """
+
+    def __init__(self):
+        self.revoked: Dict[str, float] = {}
+        self.task: Optional[asyncio.Task] = None
+
+
+    def is_revoked(self, jti: Optional[str]) -> bool:
+        return jti is not None and jti in self.revoked
+
+
+    async def revoke(self, jti: str, user_id: int, expires_at: float) -> bool:
+        """ revoke a token until its expiry, expires_at is a unix timestamp
+
+        Returns False when the token was already revoked, by this request or
+        a concurrent one, so one use of a token can be told apart from two.
+        """
+        response = await supabase.table("revoked_tokens").upsert({
+            "jti": jti,
+            "user_id": user_id,
+            "expires_at": datetime.fromtimestamp(expires_at, timezone.utc).isoformat()
+        }, on_conflict="jti", ignore_duplicates=True).execute()
+
+        self.revoked[jti] = expires_at
+        return bool(response.data)
+
+
+    async def refresh(self):
+        """ reload the unexpired revocations and delete the expired ones """
+        now = datetime.now(timezone.utc).isoformat()
+
+        await supabase.table("revoked_tokens").delete().lt("expires_at", now).execute()
+        response = await supabase.table("revoked_tokens").select("jti, expires_at").gte("expires_at", now).execute()
+
+        current = time.time()
+        revoked = {jti: expires_at for jti, expires_at in self.revoked.items() if expires_at > current}
+        for row in response.data or []:
+            revoked[row["jti"]] = parse_timestamp(row["expires_at"])
+
+        self.revoked = revoked
+
+
+    async def refresh_periodically(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning("No se pudo actualizar la lista de tokens revocados: %s", e)
+            await asyncio.sleep(REVOCATION_REFRESH_SECONDS)
+
+
+    def start(self):
+        self.task = asyncio.create_task(self.refresh_periodically())
+
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+
+def parse_timestamp(value: str) -> float:
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+revoked_tokens = RevocationList()
@@ -0,0 +1,247 @@
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, Optional, Set
+
+from app.models.ModelTimeEntry import create_time_entry, delete_time_entry, update_time_entry
+from app.schemas.schemas import TimeEntryCreate, TimeEntryUpdate
+
+
+TIMER_CHECKPOINT_SECONDS = float(os.getenv("TIMER_CHECKPOINT_SECONDS", "300"))
+# a timer without heartbeat for this long is stopped at its last heartbeat
+TIMER_HEARTBEAT_TIMEOUT = float(os.getenv("TIMER_HEARTBEAT_TIMEOUT", "600"))
+TIMER_STREAM_QUEUE_SIZE = int(os.getenv("TIMER_STREAM_QUEUE_SIZE", "100"))
+TIMER_STREAM_KEEPALIVE = float(os.getenv("TIMER_STREAM_KEEPALIVE", "15"))
+
+KEEPALIVE = object()
+
+logger = logging.getLogger(__name__)
+
+
+def utcnow() -> datetime:
+    """ naive utc, the time_entries columns are timestamps without time zone """
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class RunningTimer:
+    """ a timer being run by a user, at most one per user """
+
+    __slots__ = ("user_id", "task_id", "started_at", "last_heartbeat", "entry_id")
+
+    def __init__(self, user_id: int, task_id: int, started_at: datetime):
+        self.user_id = user_id
+        self.task_id = task_id
+        self.started_at = started_at
+        self.last_heartbeat = started_at
+        # time entry written by the first checkpoint, extended by the next ones
+        self.entry_id: Optional[int] = None
+
+
+    def to_dict(self) -> dict:
+        return {
+            "user_id": self.user_id,
+            "task_id": self.task_id,
+            "started_at": self.started_at.isoformat(),
+            "last_heartbeat": self.last_heartbeat.isoformat(),
+            "entry_id": self.entry_id,
+        }
+
+
+class TimerError(Exception):
+    pass
+
+
+class TimerRegistry:
+    """ running timers kept in memory and written to time_entries when stopped or at checkpoints
+
+    Each timer costs no datastore work while it runs: heartbeats only touch
+    memory, a checkpoint every TIMER_CHECKPOINT_SECONDS saves the interval
+    run so far and stop writes the final one. Dashboards follow the changes
+    through subscribe() instead of polling the table.
+
+    The registry belongs to the worker process, run the timer routes on a
+    single worker or route each user to the same one.
+    """
+
+    def __init__(self, checkpoint_seconds: float = TIMER_CHECKPOINT_SECONDS,
+                 heartbeat_timeout: float = TIMER_HEARTBEAT_TIMEOUT):
+        self.checkpoint_seconds = checkpoint_seconds
+        self.heartbeat_timeout = heartbeat_timeout
+        self.timers: Dict[int, RunningTimer] = {}
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.locks: Dict[int, asyncio.Lock] = {}
+        self.task: Optional[asyncio.Task] = None
+
+
+    def running(self) -> list:
+        return [timer.to_dict() for timer in self.timers.values()]
+
+
+    def get(self, user_id: int) -> Optional[RunningTimer]:
+        return self.timers.get(user_id)
+
+
+    def start_timer(self, user_id: int, task_id: int) -> RunningTimer:
+        if user_id in self.timers:
+            raise TimerError("Ya tienes un temporizador en curso.")
+
+        timer = self.timers[user_id] = RunningTimer(user_id, task_id, utcnow())
+        self.publish("started", timer)
+        return timer
+
+
+    def heartbeat(self, user_id: int) -> RunningTimer:
+        timer = self.timers.get(user_id)
+        if timer is None:
+            raise TimerError("No tienes un temporizador en curso.")
+
+        timer.last_heartbeat = utcnow()
+        return timer
+
+
+    async def stop_timer(self, user_id: int, end_time: Optional[datetime] = None) -> Optional[dict]:
+        """ write the final interval of the timer and forget it, return the time entry
+
+        When the interval is rejected the timer keeps running, so the
+        conflicting entry can be fixed and the stop retried.
+        """
+        async with self.lock(user_id):
+            timer = self.timers.get(user_id)
+            if timer is None:
+                raise TimerError("No tienes un temporizador en curso.")
+
+            entry = await self.flush(timer, end_time or utcnow())
+            self.forget(user_id)
+
+        self.publish("stopped", timer, entry=entry)
+        return entry
+
+
+    async def flush(self, timer: RunningTimer, end_time: datetime) -> Optional[dict]:
+        """ save the interval from the start of the timer to end_time, raise TimerError when it is rejected
+
+        An earlier checkpoint is shrunk to end_time, or deleted when nothing
+        of the interval is left, so an abandoned timer counts up to its last
+        heartbeat only.
+        """
+        if end_time <= timer.started_at:
+            if timer.entry_id is not None:
+                result = await delete_time_entry(timer.entry_id)
+                if "error" in result:
+                    raise TimerError(result["error"])
+                timer.entry_id = None
+            return None
+
+        if timer.entry_id is None:
+            entry = await create_time_entry(
+                timer.user_id, TimeEntryCreate(task_id=timer.task_id, start_time=timer.started_at, end_time=end_time)
+            )
+        else:
+            entry = await update_time_entry(timer.entry_id, TimeEntryUpdate(end_time=end_time))
+
+        if "error" in entry:
+            raise TimerError(entry["error"])
+
+        timer.entry_id = entry["id"]
+        return entry
+
+
+    async def checkpoint(self):
+        """ save the running intervals, stopping the timers whose heartbeats stopped """
+        now = utcnow()
+
+        for user_id, timer in list(self.timers.items()):
+            stale = (now - timer.last_heartbeat).total_seconds() > self.heartbeat_timeout
+            try:
+                if stale:
+                    await self.stop_timer(user_id, end_time=timer.last_heartbeat)
+                else:
+                    async with self.lock(user_id):
+                        if self.timers.get(user_id) is timer:
+                            await self.flush(timer, now)
+                            self.publish("checkpoint", timer)
+            except Exception as e:
+                logger.warning("No se pudo guardar el temporizador del usuario %s: %s", user_id, e)
+                if stale and self.timers.get(user_id) is timer:
+                    # nobody is left to retry an abandoned timer
+                    self.forget(user_id)
+                    self.publish("stopped", timer, error=str(e))
+
+
+    async def checkpoint_periodically(self):
+        while True:
+            await asyncio.sleep(self.checkpoint_seconds)
+            await self.checkpoint()
+
+
+    def lock(self, user_id: int) -> asyncio.Lock:
+        return self.locks.setdefault(user_id, asyncio.Lock())
+
+
+    def forget(self, user_id: int):
+        """ drop the timer and its lock, a waiter on the old lock finds no timer and gives up """
+        del self.timers[user_id]
+        self.locks.pop(user_id, None)
+
+
+    def publish(self, event: str, timer: RunningTimer, **data):
+        message = json.dumps(dict(timer.to_dict(), **data), default=str)
+
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait((event, message))
+            except asyncio.QueueFull:
+                # a consumer this far behind is dropped once it drains its queue, it reconnects and gets a new snapshot
+                self.subscribers.discard(queue)
+
+
+    async def subscribe(self) -> AsyncIterator[str]:
+        """ server-sent events: a snapshot of the running timers, then every change """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=TIMER_STREAM_QUEUE_SIZE)
+        self.subscribers.add(queue)
+
+        try:
+            yield format_event("snapshot", json.dumps(self.running()))
+
+            while True:
+                try:
+                    item = await asyncio.wait_for(queue.get(), TIMER_STREAM_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    item = KEEPALIVE
+
+                if item is None or queue not in self.subscribers:
+                    return
+
+                # the comment keeps proxies from closing an idle stream
+                yield ": keepalive\n\n" if item is KEEPALIVE else format_event(*item)
+
+        finally:
+            self.subscribers.discard(queue)
+
+
+    def start(self):
+        self.task = asyncio.create_task(self.checkpoint_periodically())
+
+
+    async def stop(self):
+        """ stop checkpointing and save the running intervals, the timers themselves are lost with the process """
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+        await self.checkpoint()
+
+        for queue in list(self.subscribers):
+            self.subscribers.discard(queue)
+            if not queue.full():
+                queue.put_nowait(None)
+
+
+def format_event(event: str, data: str) -> str:
+    return f"event: {event}\ndata: {data}\n\n"
+
+
+running_timers = TimerRegistry()
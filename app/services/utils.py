@@ -1,12 +1,17 @@
 from typing import Optional
+import asyncio
 import os
-from datetime import datetime, timedelta
-from fastapi import Depends, HTTPException
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from fastapi import Depends, HTTPException, Request
 from fastapi.security import OAuth2PasswordBearer
 from dotenv import load_dotenv
 from ..database.data import supabase
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+from app.services.cache import TTLCache
+from app.services.revocation import revoked_tokens
 
 
 load_dotenv()
@@ -15,32 +20,100 @@ load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY", "_pEE_GC1P2Z-HWU0aSqmABrXyGgr5Mm1Q5JmhP1tOq4")
 ALGORITHM = "HS256"
 
+ACCESS_TOKEN_MINUTES = int(os.getenv("ACCESS_TOKEN_MINUTES", "30"))
+REFRESH_TOKEN_DAYS = int(os.getenv("REFRESH_TOKEN_DAYS", "7"))
+# tokens issued before the expiring ones carry no type, expiry nor jti, so they can never be
+# revoked: off by default, turn on only for a migration window and turn off again after it
+ALLOW_LEGACY_TOKENS = os.getenv("ALLOW_LEGACY_TOKENS", "false").lower() == "true"
+
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1024"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+
+PASSWORD_HASH_ROUNDS = int(os.getenv("PASSWORD_HASH_ROUNDS", "29000"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/users/login")
 
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
+pwd_context = CryptContext(
+    schemes=["pbkdf2_sha256"],
+    deprecated="auto",
+    pbkdf2_sha256__default_rounds=PASSWORD_HASH_ROUNDS,
+    pbkdf2_sha256__min_rounds=PASSWORD_HASH_ROUNDS
+)
+
+password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+
+
+async def get_user_by_id(id: int):
+    """ get the id, username and role of an user, served from the cache when possible """
+    user = user_cache.get(id)
+
+    if user is None:
+        response = await supabase.table("users").select("id, username, role").eq("id", id).execute()
+
+        if not response.data or len(response.data) == 0:
+            return None
 
+        user = response.data[0]
+        user_cache.set(id, user)
 
+    return dict(user)
 
-def get_current_user(token: str = Depends(oauth2_scheme)):
-    """Verifica el JWT y extrae el usuario."""
+
+def invalidate_user(id: Optional[int] = None):
+    """ drop an user from the cache, or every user when no id is given """
+    if id is None:
+        user_cache.clear()
+    else:
+        user_cache.pop(id)
+
+
+async def resolve_user(token: str):
+    """Verifica el JWT y extrae el usuario de sus claims, sin consultar la base de datos."""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        id: str = payload.get("sub")
-        id = int(id)
-        if id is None:
-            raise HTTPException(status_code=401, detail="Token inválido")
-        
-        response = supabase.table("users").select("id, username, role").eq("id", id).execute()
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Token inválido o expirado")
 
-        if not response.data or len(response.data) == 0:
-            raise HTTPException(status_code=404, detail="Usuario no encontrado")
-        
-        return response.data[0]
+    if payload.get("sub") is None:
+        raise HTTPException(status_code=401, detail="Token inválido")
+
+    if "type" not in payload:
+        return await resolve_legacy_user(payload)
+
+    if payload["type"] != "access" or revoked_tokens.is_revoked(payload.get("jti")):
+        raise HTTPException(status_code=401, detail="Token inválido o expirado")
 
-    except jwt.JWTError:
+    return {"id": int(payload["sub"]), "username": payload.get("username"), "role": payload.get("role")}
+
+
+async def resolve_legacy_user(payload: dict):
+    """ tokens without expiry only carry the id, the user is read from the cached users table """
+    if not ALLOW_LEGACY_TOKENS:
         raise HTTPException(status_code=401, detail="Token inválido o expirado")
 
+    user = await get_user_by_id(int(payload["sub"]))
+
+    if not user:
+        raise HTTPException(status_code=404, detail="Usuario no encontrado")
+
+    return user
+
+
+async def get_current_user(request: Request, token: str = Depends(oauth2_scheme)):
+    """ Dependency that resolves the authenticated user once per request """
+    user = getattr(request.state, "current_user", None)
+
+    if user is None:
+        user = await resolve_user(token)
+        request.state.current_user = user
+
+    return user
+
 def hash_password(password: str) -> str:
     """
     Hashea una contraseña utilizando pbkdf2_sha256.
@@ -54,13 +127,43 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
     return pwd_context.verify(plain_password, hashed_password)
 
-def create_access_token(data: dict) -> str:
-    """Genera un JWT sin tiempo de expiración."""
+async def hash_password_async(password: str) -> str:
+    """
+    Hashea una contraseña en el pool de hilos sin bloquear el event loop.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_executor, hash_password, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+    """
+    Verifica una contraseña en el pool de hilos. Devuelve si es válida y,
+    cuando el hash guardado usa parámetros viejos, el hash actualizado.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        password_executor, pwd_context.verify_and_update, plain_password, hashed_password
+    )
+
+def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
+    """Genera un JWT de acceso de corta duración con el rol del usuario en sus claims."""
+    return encode_token(data, "access", expires_delta or timedelta(minutes=ACCESS_TOKEN_MINUTES))
+
+
+def create_refresh_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
+    """Genera un JWT de refresco, solo sirve para pedir nuevos tokens de acceso."""
+    return encode_token(data, "refresh", expires_delta or timedelta(days=REFRESH_TOKEN_DAYS))
+
+
+def encode_token(data: dict, token_type: str, lifetime: timedelta) -> str:
     to_encode = data.copy()
 
     if "sub" in to_encode and not isinstance(to_encode["sub"], str):
         to_encode["sub"] = str(to_encode["sub"])
 
+    now = datetime.now(timezone.utc)
+    to_encode.update({"type": token_type, "jti": uuid.uuid4().hex, "iat": now, "exp": now + lifetime})
+
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
@@ -76,9 +179,9 @@ def decode_access_token(token: str) -> dict | None:
     
 
 
-def payload(token: str):
+async def payload(token: str):
     """ Decodifica el token y obtiene el usuario autenticado """
-    user_data = get_current_user(token)  
+    user_data = await resolve_user(token)  
     if not user_data:
         raise HTTPException(status_code=401, detail="Token inválido o expirado")
     return user_data
@@ -88,7 +191,7 @@ def payload(token: str):
 def role_required(allowed_roles: list):
     """ Dependency to restrict roles """
 
-    def check_role(user: dict = Depends(get_current_user)):
+    async def check_role(user: dict = Depends(get_current_user)):
         if user["role"] not in allowed_roles:
             raise HTTPException(
                 status_code=403,
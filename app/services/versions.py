@@ -0,0 +1,113 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import uuid
+from typing import Dict, Optional
+
+from fastapi import Depends, HTTPException, Request, Response
+
+from app.database.data import supabase
+from app.services.utils import get_current_user
+
+
+COLLECTION_VERSIONS_REFRESH_SECONDS = float(os.getenv("COLLECTION_VERSIONS_REFRESH_SECONDS", "5"))
+
+# polled listings are revalidated on every use, never served from a cache without asking
+LISTING_CACHE_CONTROL = "private, no-cache"
+
+logger = logging.getLogger(__name__)
+
+
+class CollectionVersions:
+    """ version counter per collection, the ETag of a listing is derived from the versions it reads
+
+    Writes through the models bump the counters at once. The refresh merges
+    the collection_versions table, kept by triggers, so writes made by other
+    workers are seen after at most one refresh interval. Both only grow, the
+    merge keeps the highest of the two.
+    """
+
+    def __init__(self):
+        self.versions: Dict[str, int] = {}
+        # until the shared versions are loaded, ETags are only valid for this process
+        self.epoch = uuid.uuid4().hex
+        self.shared = False
+        self.task: Optional[asyncio.Task] = None
+
+
+    def bump(self, *collections: str):
+        for collection in collections:
+            self.versions[collection] = self.versions.get(collection, 0) + 1
+
+
+    def etag(self, collections: tuple, *params) -> str:
+        state = [None if self.shared else self.epoch]
+        state += [self.versions.get(collection, 0) for collection in collections]
+        state += [str(param) for param in params]
+        digest = hashlib.sha1(json.dumps(state).encode()).hexdigest()[:20]
+        return f'"{digest}"'
+
+
+    async def refresh(self):
+        response = await supabase.table("collection_versions").select("name, version").execute()
+
+        for row in response.data or []:
+            self.versions[row["name"]] = max(self.versions.get(row["name"], 0), row["version"])
+            self.shared = True
+
+
+    async def refresh_periodically(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning("No se pudieron actualizar las versiones de las colecciones: %s", e)
+            await asyncio.sleep(COLLECTION_VERSIONS_REFRESH_SECONDS)
+
+
+    def start(self):
+        self.task = asyncio.create_task(self.refresh_periodically())
+
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """ If-None-Match comparison, weak validators match their strong counterpart """
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(candidate.strip().removeprefix("W/") == etag for candidate in header.split(","))
+
+
+def listing_etag(*collections: str, per_user: bool = False):
+    """ dependency tagging a listing with the versions of the collections it reads
+
+    Answers 304 before the endpoint runs when If-None-Match holds the current
+    ETag, otherwise sets the ETag on the response. The path and the query
+    string are part of the ETag, and the user too when the listing is per user.
+    """
+
+    async def check(request: Request, response: Response, user: dict = Depends(get_current_user)) -> str:
+        etag = collection_versions.etag(
+            collections, request.url.path, request.url.query, user["id"] if per_user else None
+        )
+        headers = {"ETag": etag, "Cache-Control": LISTING_CACHE_CONTROL}
+
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            raise HTTPException(status_code=304, headers=headers)
+
+        response.headers.update(headers)
+        return etag
+
+    return check
+
+
+collection_versions = CollectionVersions()
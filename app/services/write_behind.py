@@ -0,0 +1,349 @@
+import asyncio
+import fcntl
+import glob
+import itertools
+import json
+import logging
+import os
+import random
+import tempfile
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Set, Tuple
+
+from postgrest.exceptions import APIError
+
+from app.database.data import supabase
+from app.models.ModelTimeEntry import EXCLUSION_VIOLATION, OVERLAP_ERROR, calculate_duration, entry_row, overlap_error, record_changes
+from app.schemas.schemas import TimeEntryCreate
+
+
+WRITE_BEHIND_ENABLED = os.getenv("TIME_ENTRY_WRITE_BEHIND", "false").lower() == "true"
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("TIME_ENTRY_BATCH_SIZE", "200"))
+WRITE_BEHIND_FLUSH_SECONDS = float(os.getenv("TIME_ENTRY_FLUSH_SECONDS", "0.5"))
+WRITE_BEHIND_QUEUE_SIZE = int(os.getenv("TIME_ENTRY_QUEUE_SIZE", "10000"))
+WRITE_BEHIND_RETRY_MAX_SECONDS = float(os.getenv("TIME_ENTRY_RETRY_MAX_SECONDS", "30"))
+WRITE_BEHIND_SPOOL_DIR = os.getenv("TIME_ENTRY_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "timer-time-entries"))
+WRITE_BEHIND_FSYNC = os.getenv("TIME_ENTRY_SPOOL_FSYNC", "true").lower() == "true"
+
+# outcomes of flushed entries kept for the status lookups
+OUTCOMES_KEPT = 10000
+
+# provisional ids are a random prefix per process over a counter, so they do
+# not repeat across workers and restarts and stay within the 53 bits a JSON
+# number holds exactly
+PROVISIONAL_PREFIX_BITS = 21
+PROVISIONAL_COUNTER_BITS = 32
+
+PENDING = "pendiente"
+SAVED = "guardado"
+FAILED = "error"
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindFull(Exception):
+    pass
+
+
+class TimeEntryWriteBehind:
+    """ queue of validated time entries inserted in batches off the request path
+
+    submit() appends the entry to a spool file, fsynced, and answers with a
+    negative provisional id, unique across workers and kept on replay. A flusher inserts the queue with one multi-row
+    insert per batch_size entries, as soon as a batch is full or every
+    flush_seconds. Transient failures are retried with backoff and keep the
+    entries queued. A batch rejected by the database (an overlap, an unknown
+    task) is retried row by row, so only the offending entries fail.
+
+    Every worker writes its own spool. On start a worker takes over the
+    spools left by workers that died, found because nobody holds their
+    lock: their pending entries are copied into its own spool, fsynced,
+    before the old file is removed. A
+    crash between an insert and its "done" record replays entries that were
+    already saved. The time_entries_no_overlap constraint rejects those
+    copies, so they end up as failed outcomes instead of duplicates.
+    """
+
+    def __init__(self, enabled: bool = WRITE_BEHIND_ENABLED, batch_size: int = WRITE_BEHIND_BATCH_SIZE,
+                 flush_seconds: float = WRITE_BEHIND_FLUSH_SECONDS, queue_size: int = WRITE_BEHIND_QUEUE_SIZE,
+                 spool_dir: str = WRITE_BEHIND_SPOOL_DIR, fsync: bool = WRITE_BEHIND_FSYNC):
+        self.enabled = enabled
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.queue_size = queue_size
+        self.spool_dir = spool_dir
+        self.fsync = fsync
+        self.pending: "OrderedDict[int, dict]" = OrderedDict()
+        self.pending_by_user: Dict[int, Set[int]] = {}
+        self.outcomes: "OrderedDict[int, Tuple[int, dict]]" = OrderedDict()
+        self.id_prefix = random.getrandbits(PROVISIONAL_PREFIX_BITS)
+        self.sequence = 0
+        self.wakeup: Optional[asyncio.Event] = None
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.spool = None
+        self.spool_path: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+
+
+    async def start(self):
+        if not self.enabled:
+            return
+
+        os.makedirs(self.spool_dir, exist_ok=True)
+        # a single thread keeps the spool writes in order
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="time-entry-spool")
+        self.spool_path = os.path.join(self.spool_dir, f"{os.getpid()}-{uuid.uuid4().hex[:8]}.jsonl")
+        # locked under a name the other workers do not look for, then renamed,
+        # so a worker starting at the same time never takes it for an orphan
+        self.spool = open(f"{self.spool_path}.new", "a", encoding="utf-8")
+        fcntl.flock(self.spool, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        os.rename(f"{self.spool_path}.new", self.spool_path)
+
+        self.wakeup = asyncio.Event()
+        self.claim_orphans()
+
+        self.task = asyncio.create_task(self.flush_periodically())
+
+
+    async def stop(self):
+        """ stop the flusher and insert what is left, entries that still fail stay in the spool for the next start """
+        if self.task is None:
+            return
+
+        self.task.cancel()
+        await asyncio.gather(self.task, return_exceptions=True)
+        self.task = None
+
+        try:
+            await self.flush_ready()
+        except Exception as e:
+            logger.warning("Quedan %s registros de tiempo en %s: %s", len(self.pending), self.spool_path, e)
+
+        self.spool.close()
+        if not self.pending:
+            os.remove(self.spool_path)
+        self.executor.shutdown(wait=True)
+
+
+    async def submit(self, user_id: int, entry_data: TimeEntryCreate) -> dict:
+        """ validate and queue a time entry, return it with its provisional id
+
+        Raises WriteBehindFull when the queue is at its limit. Overlaps are
+        checked against the entries of the user still queued here, the ones
+        already stored are checked by the database when the batch is inserted.
+        """
+        if entry_data.start_time >= entry_data.end_time:
+            return {"error": "La hora de inicio debe ser menor a la hora de finalización."}
+
+        if len(self.pending) >= self.queue_size:
+            raise WriteBehindFull()
+
+        row = entry_row(user_id, entry_data)
+
+        for entry_id in self.pending_by_user.get(user_id, ()):
+            queued = self.pending[entry_id]
+            if queued["start_time"] < row["end_time"] and row["start_time"] < queued["end_time"]:
+                return overlap_error(dict(queued, id=entry_id))
+
+        entry_id = await self.enqueue(row)
+
+        return dict(row, id=entry_id, duration=calculate_duration(entry_data.start_time, entry_data.end_time))
+
+
+    async def enqueue(self, row: dict) -> int:
+        self.sequence += 1
+        entry_id = -((self.id_prefix << PROVISIONAL_COUNTER_BITS) | self.sequence)
+
+        # queued before the write is scheduled, so the spool is never truncated
+        # between the record and the entry, and durable before it is acknowledged
+        self.track(entry_id, row)
+
+        try:
+            await self.write({"add": entry_id, "row": row})
+        except Exception:
+            self.forget(entry_id)
+            self.outcomes.pop(entry_id, None)
+            raise
+
+        if len(self.pending) >= self.batch_size:
+            self.wakeup.set()
+
+        return entry_id
+
+
+    def track(self, entry_id: int, row: dict):
+        self.pending[entry_id] = row
+        self.pending_by_user.setdefault(row["user_id"], set()).add(entry_id)
+        self.set_outcome(entry_id, row["user_id"], {"status": PENDING})
+
+
+    def forget(self, entry_id: int):
+        row = self.pending.pop(entry_id, None)
+        if row is not None:
+            queued = self.pending_by_user.get(row["user_id"])
+            queued.discard(entry_id)
+            if not queued:
+                del self.pending_by_user[row["user_id"]]
+
+
+    def status(self, entry_id: int, user_id: int) -> Optional[dict]:
+        """ outcome of a queued entry, only for the user who queued it """
+        owner, outcome = self.outcomes.get(entry_id, (None, None))
+        return outcome if owner == user_id else None
+
+
+    def set_outcome(self, entry_id: int, user_id: int, outcome: dict):
+        self.outcomes[entry_id] = (user_id, outcome)
+        self.outcomes.move_to_end(entry_id)
+        while len(self.outcomes) > OUTCOMES_KEPT:
+            self.outcomes.popitem(last=False)
+
+
+    async def flush_periodically(self):
+        delay = 0.0
+
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+
+            try:
+                await self.flush_ready()
+                delay = 0.0
+            except Exception as e:
+                delay = min(WRITE_BEHIND_RETRY_MAX_SECONDS, max(delay * 2, self.flush_seconds))
+                logger.warning("No se pudo insertar el lote de registros de tiempo, reintento en %.1fs: %s", delay, e)
+                await asyncio.sleep(delay)
+
+
+    async def flush_ready(self):
+        while self.pending:
+            batch = list(itertools.islice(self.pending.items(), self.batch_size))
+            await self.flush_batch(batch)
+
+        if not self.pending:
+            await self.run_in_spool(self.truncate_spool)
+
+
+    async def flush_batch(self, batch: List[Tuple[int, dict]]):
+        try:
+            response = await supabase.table("time_entries").insert([row for _, row in batch]).execute()
+        except APIError as e:
+            if not is_rejected(e):
+                raise
+            await self.flush_one_by_one(batch)
+            return
+
+        await self.saved(batch, response.data or [])
+
+
+    async def flush_one_by_one(self, batch: List[Tuple[int, dict]]):
+        for entry_id, row in batch:
+            try:
+                response = await supabase.table("time_entries").insert(row).execute()
+            except APIError as e:
+                if not is_rejected(e):
+                    raise
+                logger.warning("Registro de tiempo %s rechazado: %s", entry_id, e.message)
+                self.forget(entry_id)
+                self.set_outcome(entry_id, row["user_id"], {"status": FAILED, "error": OVERLAP_ERROR if e.code == EXCLUSION_VIOLATION else e.message})
+                await self.write({"done": [entry_id]})
+                continue
+
+            await self.saved([(entry_id, row)], response.data or [])
+
+
+    async def saved(self, batch: List[Tuple[int, dict]], rows: List[dict]):
+        for (entry_id, _), row in zip(batch, rows):
+            self.forget(entry_id)
+            self.set_outcome(entry_id, row["user_id"], {"status": SAVED, "id": row["id"]})
+
+        await self.write({"done": [entry_id for entry_id, _ in batch[:len(rows)]]})
+        await record_changes(created=rows)
+
+
+    def claim_orphans(self):
+        """ queue the pending rows of the spools whose worker is gone, with their provisional ids
+
+        The rows are written to this worker's spool and fsynced before the
+        old spool is removed, a crash in between leaves them in one of both.
+        """
+        for path in sorted(glob.glob(os.path.join(self.spool_dir, "*.jsonl"))):
+            if path == self.spool_path:
+                continue
+
+            with open(path, encoding="utf-8") as file:
+                try:
+                    fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+                if os.fstat(file.fileno()).st_nlink == 0:
+                    # claimed and removed by another worker while we waited for the lock
+                    continue
+
+                pending = read_spool(file)
+                if pending:
+                    self.spool.write("".join(
+                        json.dumps({"add": entry_id, "row": row}, separators=(",", ":")) + "\n"
+                        for entry_id, row in pending.items()
+                    ))
+                    self.spool.flush()
+                    # durable here whatever TIME_ENTRY_SPOOL_FSYNC says, the old copy is about to go
+                    os.fsync(self.spool.fileno())
+                os.remove(path)
+
+            for entry_id, row in pending.items():
+                self.track(entry_id, row)
+            logger.info("Reanudando %s registros de tiempo de %s", len(pending), path)
+
+
+    async def write(self, record: dict):
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        await self.run_in_spool(self.write_line, line)
+
+
+    async def run_in_spool(self, function, *args):
+        await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+
+    def write_line(self, line: str):
+        self.spool.write(line)
+        self.spool.flush()
+        if self.fsync:
+            os.fsync(self.spool.fileno())
+
+
+    def truncate_spool(self):
+        # nothing pending, the records so far can go
+        self.spool.truncate(0)
+
+
+def read_spool(file) -> "OrderedDict[int, dict]":
+    """ rows added and not done, in the order they were queued """
+    pending: "OrderedDict[int, dict]" = OrderedDict()
+
+    for line in file:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            # a line cut by the crash was never acknowledged
+            continue
+
+        if "add" in record:
+            pending[record["add"]] = record["row"]
+        for entry_id in record.get("done", ()):
+            pending.pop(entry_id, None)
+
+    return pending
+
+
+def is_rejected(error: APIError) -> bool:
+    """ integrity errors (sqlstate class 23) will fail again, anything else is worth a retry """
+    return str(error.code or "").startswith("23")
+
+
+time_entry_writer = TimeEntryWriteBehind()
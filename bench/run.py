@@ -0,0 +1,233 @@
+"""Load-test the hot endpoints of the API against the in-memory datastore.
+
+Drives the real FastAPI app from app/main.py in-process through an ASGI
+transport, so the numbers include routing, dependencies, validation and
+serialization but no network:
+
+    python -m bench.run --profile small
+    python -m bench.run --profile small --save-baseline bench/baseline.json
+    python -m bench.run --profile small --baseline bench/baseline.json --fail-on-regression
+    python -m bench.run --profile small --accept-encoding identity
+
+Each scenario reports p50/p95/p99 latency, throughput, the mean size of
+the response bodies as sent, compressed or not, and the peak RSS of the
+process once it finished. Requests send the Accept-Encoding of a browser
+unless --accept-encoding says otherwise.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+os.environ["DATA_BACKEND"] = "memory"
+
+import httpx  # noqa: E402
+
+from app.database.data import supabase  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models.ModelRollup import ROLLUP_ENABLED, rebuild_rollup  # noqa: E402
+from app.services.utils import create_access_token  # noqa: E402
+from bench.seed import PROFILES, seed_datastore  # noqa: E402
+
+
+NEW_ENTRIES_START = datetime(2030, 1, 1)
+
+REPORT_RANGE = {"start_date": "2025-03-01T00:00:00", "end_date": "2025-03-31T23:59:59"}
+
+
+@dataclass
+class Scenario:
+    method: str
+    path: str
+    body: Optional[Callable[[random.Random, dict, int], dict]] = None
+    requests: int = 200
+
+
+def time_entry_body(rng: random.Random, volumes: dict, index: int) -> dict:
+    # one slot per request after the seeded history, so entries never overlap
+    start_time = NEW_ENTRIES_START + timedelta(hours=index)
+    return {
+        "task_id": rng.randint(1, volumes["tasks"]),
+        "start_time": start_time.isoformat(),
+        "end_time": (start_time + timedelta(minutes=30)).isoformat()
+    }
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    "time_entry_create": Scenario("POST", "/timeEntry/create", time_entry_body, requests=500),
+    "tasks_by_user": Scenario("GET", "/tasks/get_tasks_by_user", requests=500),
+    "task_board": Scenario("GET", "/tasks/get_task?limit=100", requests=500),
+    "time_entries_page": Scenario("GET", "/timeEntry/get_all_time_entries?user_id=1&limit=1000", requests=200),
+    "hours_by_client": Scenario("POST", "/reports/hours_by_client/", lambda rng, volumes, index: REPORT_RANGE, requests=20),
+    "get_time_entries": Scenario("POST", "/reports/get_time_entries", lambda rng, volumes, index: REPORT_RANGE, requests=20),
+    "download_report": Scenario("POST", "/reports/download_report", lambda rng, volumes, index: REPORT_RANGE, requests=20),
+    "download_client_report": Scenario(
+        "POST", "/reports/download_client_report",
+        lambda rng, volumes, index: dict(REPORT_RANGE, client_id=rng.randint(1, volumes["clients"])),
+        requests=20
+    ),
+    "export_csv": Scenario("POST", "/reports/export?format=csv", lambda rng, volumes, index: REPORT_RANGE, requests=20),
+    "export_parquet": Scenario("POST", "/reports/export?format=parquet", lambda rng, volumes, index: REPORT_RANGE, requests=20),
+}
+
+
+def peak_rss_mb() -> float:
+    """ peak resident set size of this process in MiB """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run_scenario(client: httpx.AsyncClient, scenario: Scenario, volumes: dict,
+                       headers: dict, concurrency: int, scale: float, seed: int) -> dict:
+    rng = random.Random(seed)
+    total = max(1, int(scenario.requests * scale))
+    latencies: List[float] = []
+    sizes: List[int] = []
+    errors = 0
+    pending = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for index in pending:
+            body = scenario.body(rng, volumes, index) if scenario.body else None
+            started = time.perf_counter()
+            response = await client.request(scenario.method, scenario.path, json=body, headers=headers)
+            latencies.append(time.perf_counter() - started)
+            sizes.append(response.num_bytes_downloaded)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, total))))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "requests": total,
+        "errors": errors,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000,
+        "throughput_rps": total / elapsed,
+        "mean_kb": statistics.fmean(sizes) / 1024,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+async def run(args) -> dict:
+    seed_started = time.perf_counter()
+    volumes = seed_datastore(supabase, args.profile, args.seed)
+    if ROLLUP_ENABLED:
+        await rebuild_rollup()
+    seed_seconds = time.perf_counter() - seed_started
+
+    headers = {
+        "Authorization": f"Bearer {create_access_token({'sub': 1, 'role': 'socio'})}",
+        "Accept-Encoding": args.accept_encoding,
+    }
+    selected = args.scenarios or list(SCENARIOS)
+    results = {}
+
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            for name in selected:
+                results[name] = await run_scenario(
+                    client, SCENARIOS[name], volumes, headers, args.concurrency, args.scale, args.seed
+                )
+                print_result(name, results[name])
+
+    return {
+        "profile": args.profile,
+        "volumes": volumes,
+        "seed_seconds": seed_seconds,
+        "concurrency": args.concurrency,
+        "accept_encoding": args.accept_encoding,
+        "python": platform.python_version(),
+        "scenarios": results,
+    }
+
+
+def print_result(name: str, result: dict):
+    print(
+        f"{name:<24} n={result['requests']:<5} err={result['errors']:<3} "
+        f"p50={result['p50_ms']:9.2f}ms p95={result['p95_ms']:9.2f}ms p99={result['p99_ms']:9.2f}ms "
+        f"{result['throughput_rps']:9.1f} req/s {result['mean_kb']:9.1f}KiB rss={result['peak_rss_mb']:8.1f}MiB",
+        flush=True
+    )
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    """ print the change against a stored run and return the regressions """
+    regressions = []
+    print(f"\ncomparison against baseline (tolerance {tolerance:.0%})")
+
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if previous is None:
+            print(f"{name:<24} no baseline")
+            continue
+
+        p95_change = current["p95_ms"] / previous["p95_ms"] - 1
+        rps_change = current["throughput_rps"] / previous["throughput_rps"] - 1
+        rss_change = current["peak_rss_mb"] / previous["peak_rss_mb"] - 1
+        size = f"  body {current['mean_kb'] / previous['mean_kb'] - 1:+7.1%}" if previous.get("mean_kb") else ""
+        print(f"{name:<24} p95 {p95_change:+7.1%}  throughput {rps_change:+7.1%}  peak rss {rss_change:+7.1%}{size}")
+
+        if p95_change > tolerance:
+            regressions.append(f"{name}: p95 {p95_change:+.1%}")
+        if rps_change < -tolerance:
+            regressions.append(f"{name}: throughput {rps_change:+.1%}")
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profile", choices=PROFILES, default="small")
+    parser.add_argument("--scenarios", nargs="*", choices=SCENARIOS, help="run only these scenarios")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply the number of requests per scenario")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--accept-encoding", default="gzip, deflate, br", help="Accept-Encoding sent with every request")
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--baseline", help="compare against the results stored in this file")
+    parser.add_argument("--save-baseline", help="store the results as the new baseline in this file")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(run(args))
+
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+
+        if regressions:
+            print("\nregressions:\n  " + "\n  ".join(regressions))
+            if args.fail_on_regression:
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Seed the in-memory datastore with a realistic volume of data.
+
+Profiles follow the shape of the firm's data: a few dozen users, hundreds
+of clients, tens of thousands of tasks and millions of time entries spread
+over two years of working days.
+"""
+
+import random
+from datetime import datetime, timedelta
+
+from app.database.memory import MemoryDatastore
+from app.services.utils import hash_password
+
+
+PROFILES = {
+    "tiny": {"users": 5, "clients": 20, "tasks": 200, "time_entries": 5_000},
+    "small": {"users": 20, "clients": 100, "tasks": 2_000, "time_entries": 100_000},
+    "medium": {"users": 50, "clients": 500, "tasks": 20_000, "time_entries": 500_000},
+    "full": {"users": 50, "clients": 500, "tasks": 20_000, "time_entries": 2_000_000},
+}
+
+ROLES = ["socio", "senior", "consultor", "junior", "auxiliar"]
+
+BENCH_PASSWORD = "benchmark"
+
+HISTORY_START = datetime(2024, 1, 1, 7, 0)
+HISTORY_DAYS = 730
+
+
+def seed_datastore(datastore: MemoryDatastore, profile: str, seed: int = 7) -> dict:
+    """ fill the datastore with the volumes of a profile and return them """
+    volumes = PROFILES[profile]
+    rng = random.Random(seed)
+
+    hashed_password = hash_password(BENCH_PASSWORD)
+
+    users = datastore.get_table("users")
+    for user_id in range(1, volumes["users"] + 1):
+        users.insert({
+            "id": user_id,
+            "username": f"user{user_id}",
+            "hashed_password": hashed_password,
+            "role": ROLES[0] if user_id == 1 else rng.choice(ROLES)
+        })
+
+    clients = datastore.get_table("clients")
+    for client_id in range(1, volumes["clients"] + 1):
+        clients.insert({"id": client_id, "name": f"Cliente {client_id}", "color": f"#{rng.randrange(0xFFFFFF):06x}"})
+
+    tasks = datastore.get_table("tasks")
+    for task_id in range(1, volumes["tasks"] + 1):
+        tasks.insert({
+            "id": task_id,
+            "client_id": rng.randint(1, volumes["clients"]),
+            "title": f"Tarea {task_id % 400}",
+            "description": None,
+            "assigned_to_id": rng.randint(1, volumes["users"]),
+            "status": rng.choice(["pendiente", "en progreso", "completada"]),
+            "due_date": (HISTORY_START + timedelta(days=rng.randrange(HISTORY_DAYS + 90))).isoformat()
+        })
+
+    entries = datastore.get_table("time_entries")
+    for entry_id in range(1, volumes["time_entries"] + 1):
+        start_time = HISTORY_START + timedelta(
+            days=rng.randrange(HISTORY_DAYS),
+            minutes=15 * rng.randrange(40)
+        )
+        duration = 0.25 * rng.randint(1, 16)
+        entries.insert({
+            "id": entry_id,
+            "task_id": rng.randint(1, volumes["tasks"]),
+            "user_id": rng.randint(1, volumes["users"]),
+            "start_time": start_time.isoformat(),
+            "end_time": (start_time + timedelta(hours=duration)).isoformat(),
+            "duration": duration
+        })
+
+    return volumes
@@ -0,0 +1,173 @@
+"""Measure the cold start of the API process and enforce a startup budget.
+
+Every run starts a fresh interpreter with ``-X importtime`` that imports
+app/main.py, runs its lifespan and serves ``GET /`` in-process against the
+in-memory datastore, the same path a uvicorn worker goes through before its
+first response:
+
+    python -m bench.startup
+    python -m bench.startup --runs 10 --top 30
+    python -m bench.startup --budget-ms 1200 --output startup.json
+
+It reports the median import and first response times, the slowest modules
+by cumulative import time and the import time per top level package. The
+process exits with 1 when the median cold start is over --budget-ms or when
+one of the --forbid modules was imported before the first response.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List
+
+
+# heavy dependencies that only some endpoints need, they must load on first use
+FORBIDDEN_MODULES = ("pandas", "numpy", "pyarrow", "xlsxwriter", "openpyxl")
+
+PROBE = """
+import asyncio, json, sys, time
+
+started = time.perf_counter()
+from app.main import app
+imported = time.perf_counter()
+
+import httpx
+
+async def first_response():
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://startup") as client:
+            response = await client.get("/")
+            response.raise_for_status()
+
+asyncio.run(first_response())
+served = time.perf_counter()
+
+print(json.dumps({
+    "import_seconds": imported - started,
+    "first_response_seconds": served - started,
+    "modules": sorted(sys.modules),
+}))
+"""
+
+
+def parse_importtime(output: str) -> List[dict]:
+    """ the modules of a -X importtime report with their self and cumulative microseconds """
+    modules = []
+
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        modules.append({
+            "module": name.strip(),
+            "self_us": int(self_us),
+            "cumulative_us": int(cumulative_us),
+        })
+
+    return modules
+
+
+def run_once() -> dict:
+    env = dict(os.environ, DATA_BACKEND="memory", PYTHONDONTWRITEBYTECODE="1")
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE],
+        capture_output=True, text=True, env=env, check=False
+    )
+
+    if completed.returncode != 0:
+        raise RuntimeError(f"startup probe failed:\n{completed.stderr[-2000:]}")
+
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result["imports"] = parse_importtime(completed.stderr)
+    return result
+
+
+def summarize(runs: List[dict], top: int, forbidden: List[str]) -> dict:
+    cumulative: Dict[str, List[int]] = defaultdict(list)
+    packages: Dict[str, List[int]] = defaultdict(list)
+
+    for run in runs:
+        per_package: Dict[str, int] = defaultdict(int)
+        for entry in run["imports"]:
+            cumulative[entry["module"]].append(entry["cumulative_us"])
+            per_package[entry["module"].split(".")[0]] += entry["self_us"]
+        for package, self_us in per_package.items():
+            packages[package].append(self_us)
+
+    slowest = sorted(
+        ((module, statistics.median(samples)) for module, samples in cumulative.items()),
+        key=lambda item: item[1], reverse=True
+    )[:top]
+    heaviest = sorted(
+        ((package, statistics.median(samples)) for package, samples in packages.items()),
+        key=lambda item: item[1], reverse=True
+    )[:top]
+    loaded = set().union(*(run["modules"] for run in runs))
+
+    return {
+        "runs": len(runs),
+        "import_ms": statistics.median(run["import_seconds"] for run in runs) * 1000,
+        "first_response_ms": statistics.median(run["first_response_seconds"] for run in runs) * 1000,
+        "modules_loaded": statistics.median(len(run["modules"]) for run in runs),
+        "slowest_modules": [{"module": module, "cumulative_ms": us / 1000} for module, us in slowest],
+        "packages": [{"package": package, "self_ms": us / 1000} for package, us in heaviest],
+        "forbidden_loaded": sorted(module for module in forbidden if module in loaded),
+    }
+
+
+def print_summary(summary: dict):
+    print(f"\nslowest modules (cumulative, median of {summary['runs']} runs)")
+    for entry in summary["slowest_modules"]:
+        print(f"  {entry['cumulative_ms']:9.1f}ms  {entry['module']}")
+
+    print("\nimport time per package (self)")
+    for entry in summary["packages"]:
+        print(f"  {entry['self_ms']:9.1f}ms  {entry['package']}")
+
+    print(
+        f"\nimport app.main   {summary['import_ms']:9.1f}ms"
+        f"\nfirst response    {summary['first_response_ms']:9.1f}ms"
+        f"\nmodules loaded    {summary['modules_loaded']:9.0f}"
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=20, help="number of modules and packages listed")
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("STARTUP_BUDGET_MS", "1500")),
+                        help="maximum median time from interpreter start of the import to the first response")
+    parser.add_argument("--forbid", nargs="*", default=list(FORBIDDEN_MODULES),
+                        help="modules that must not be imported before the first response")
+    parser.add_argument("--output", help="write the summary as JSON")
+    args = parser.parse_args(argv)
+
+    summary = summarize([run_once() for _ in range(args.runs)], args.top, args.forbid)
+    summary["budget_ms"] = args.budget_ms
+    print_summary(summary)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(summary, file, indent=2)
+
+    failures = []
+    if summary["first_response_ms"] > args.budget_ms:
+        failures.append(f"first response {summary['first_response_ms']:.1f}ms over the {args.budget_ms:.0f}ms budget")
+    if summary["forbidden_loaded"]:
+        failures.append(f"imported at startup: {', '.join(summary['forbidden_loaded'])}")
+
+    if failures:
+        print("\nstartup budget exceeded:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+
+    print(f"\nwithin the {args.budget_ms:.0f}ms startup budget")
+
+
+if __name__ == "__main__":
+    main()